@@ -2,20 +2,35 @@ from __future__ import annotations
 from dotenv import load_dotenv
 load_dotenv()
 
-import json
+import asyncio
+import functools
+import logging
+import logging.handlers
 import os
+import queue
+import threading
+import uuid
+import weakref
 from typing import Dict, List, Optional
 from contextlib import asynccontextmanager
 from pathlib import Path
 
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from pydantic import BaseModel
 
+from cachetools import TTLCache
+from google.api_core.exceptions import NotFound, PreconditionFailed
 from google.cloud import storage
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import orjson
+import xxhash
+import zstandard
 
-from .services.llm_openai import OpenAIChat
-from .state_graph import graph
+from .services.llm_openai import aclose_shared_clients
+from .state_graph import graph, llm as graph_llm
 
 
 # -----------------------------------------------------------------------------
@@ -27,24 +42,57 @@ _repo_root = _agent_root.parent
 load_dotenv(dotenv_path=_agent_root / ".env", override=True)
 load_dotenv(dotenv_path=_repo_root / ".env", override=True)
 
+# LOG_LEVEL=DEBUG also prints the per-turn message dumps and GCS load/save lines.
+# While the app runs (see lifespan), records are handed to a queue and written to
+# stderr by a listener thread, so logging from request handlers and graph nodes
+# never blocks the event loop on I/O.
+_log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+_log_stream = logging.StreamHandler()
+_log_stream.setFormatter(logging.Formatter("%(levelname)s %(name)s: %(message)s"))
+_log_listener = logging.handlers.QueueListener(_log_queue, _log_stream)
+# No formatter on the queue side: the listener's handler formats each record once
+_log_handler = logging.handlers.QueueHandler(_log_queue)
+# LOG_LEVEL applies to the app's own loggers (agent.*); the root logger, and so
+# third-party libraries such as httpx, stays at WARNING
+logging.getLogger("agent").setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+log = logging.getLogger("agent.chat")
+
 
 # -----------------------------------------------------------------------------
 # System prompt
 # -----------------------------------------------------------------------------
 _system_prompt_file = _repo_root / "prompts" / "system_prompt.json"
-if _system_prompt_file.exists():
-    data = json.loads(_system_prompt_file.read_text(encoding="utf-8"))
-    DEFAULT_SYSTEM_PROMPT = data.get("prompt", "")
-else:
-    DEFAULT_SYSTEM_PROMPT = (
-        "You are an AI Mentor inspired at Steve Jobs, acting as a mentor for startup founders.",
-        "Speak with sharp insight, challenge assumptions, and push people to think bigger.",
-        "Always focus on product excellence, user experience, innovation, and building impactful companies.",
-        "Keep answers short (2–4 sentences), practical, and inspiring.",
-        "Prefer natural conversation: share one point, then ask a follow-up question to gather context.",
-        "Do not drift into unrelated topics.",
-        "Avoid long encyclopedic responses or lengthy bullet lists unless explicitly asked."
-    )
+
+_FALLBACK_SYSTEM_PROMPT = (
+    "You are an AI Mentor inspired at Steve Jobs, acting as a mentor for startup founders.",
+    "Speak with sharp insight, challenge assumptions, and push people to think bigger.",
+    "Always focus on product excellence, user experience, innovation, and building impactful companies.",
+    "Keep answers short (2–4 sentences), practical, and inspiring.",
+    "Prefer natural conversation: share one point, then ask a follow-up question to gather context.",
+    "Do not drift into unrelated topics.",
+    "Avoid long encyclopedic responses or lengthy bullet lists unless explicitly asked."
+)
+
+
+@functools.cache
+def _load_system_prompt():
+    """Parse prompts/system_prompt.json once per process."""
+    if _system_prompt_file.exists():
+        data = orjson.loads(_system_prompt_file.read_bytes())
+        return data.get("prompt", "")
+    return _FALLBACK_SYSTEM_PROMPT
+
+
+DEFAULT_SYSTEM_PROMPT = _load_system_prompt()
+
+
+# -----------------------------------------------------------------------------
+# CORS (configurable via .env, evaluated once at import)
+# -----------------------------------------------------------------------------
+#   CORS_ALLOW_ORIGINS=https://yourdomain.com,https://other.com   (default "*")
+CORS_ALLOW_ORIGINS: List[str] = [
+    o.strip() for o in os.getenv("CORS_ALLOW_ORIGINS", "*").split(",") if o.strip()
+] or ["*"]
 
 
 # -----------------------------------------------------------------------------
@@ -61,7 +109,12 @@ if not BUCKET_NAME:
         "Please set it in your .env file, e.g., GCS_BUCKET_NAME=ai-mentor-checkpoints"
     )
 
+# Connection pool for the GCS client's HTTP session. Saves run in worker threads,
+# so the default pool of 10 would otherwise drop and reopen TLS connections.
+GCS_POOL_SIZE = 32
+
 _gcs_client: Optional[storage.Client] = None
+_gcs_bucket_handle: Optional[storage.Bucket] = None
 
 
 def _gcs() -> storage.Client:
@@ -69,53 +122,322 @@ def _gcs() -> storage.Client:
     global _gcs_client
     if _gcs_client is None:
         project = os.getenv("GOOGLE_CLOUD_PROJECT") or os.getenv("GCLOUD_PROJECT")
-        _gcs_client = storage.Client(project=project) if project else storage.Client()
+        client = storage.Client(project=project) if project else storage.Client()
+        adapter = HTTPAdapter(
+            pool_connections=GCS_POOL_SIZE,
+            pool_maxsize=GCS_POOL_SIZE,
+            max_retries=Retry(total=2, backoff_factor=0.1),
+        )
+        client._http.mount("https://", adapter)
+        _gcs_client = client
     return _gcs_client
 
 
+def _gcs_bucket() -> storage.Bucket:
+    """Return the (singleton) handle for the threads bucket."""
+    global _gcs_bucket_handle
+    if _gcs_bucket_handle is None:
+        _gcs_bucket_handle = _gcs().bucket(BUCKET_NAME)
+    return _gcs_bucket_handle
+
+
+# Each thread is an append-only, compressed NDJSON object (one message per line). New messages
+# are uploaded as a small part object and appended with a server-side compose; the
+# object is rewritten as a single component once it accumulates THREAD_COMPACT_PARTS.
+THREAD_COMPACT_PARTS = 32
+# Appends retried this many times while other writers keep winning the race
+THREAD_APPEND_ATTEMPTS = 10
+
+
+# Objects are zstd-compressed. Every upload is its own zstd frame, and a composed
+# object is simply a sequence of frames, so appends stay server-side.
+THREAD_CONTENT_TYPE = "application/zstd"
+THREAD_ZSTD_LEVEL = 3
+
+_zstd_local = threading.local()  # (de)compressor objects are not thread-safe
+
+
 def _thread_blob(thread_id: str) -> storage.Blob:
-    bucket = _gcs().bucket(BUCKET_NAME)
-    path = f"{THREADS_PREFIX}/{thread_id}.json"
-    return bucket.blob(path)
+    return _gcs_bucket().blob(f"{THREADS_PREFIX}/{thread_id}.ndjson.zst")
 
 
-def load_thread_from_gcs(thread_id: str) -> List[dict]:
-    """Load a thread’s messages from GCS. Return [] if not found."""
+def _thread_part_blob(thread_id: str) -> storage.Blob:
+    return _gcs_bucket().blob(f"{THREADS_PREFIX}/{thread_id}/part-{uuid.uuid4().hex}.ndjson.zst")
+
+
+def _legacy_thread_blob(thread_id: str) -> storage.Blob:
+    """Full-history JSON object written by earlier versions."""
+    return _gcs_bucket().blob(f"{THREADS_PREFIX}/{thread_id}.json")
+
+
+def _zstd() -> tuple:
+    codecs = getattr(_zstd_local, "codecs", None)
+    if codecs is None:
+        codecs = _zstd_local.codecs = (
+            zstandard.ZstdCompressor(level=THREAD_ZSTD_LEVEL),
+            zstandard.ZstdDecompressor(),
+        )
+    return codecs
+
+
+def _encode_ndjson(messages: List[dict]) -> bytes:
+    return b"".join(orjson.dumps(m, option=orjson.OPT_APPEND_NEWLINE) for m in messages)
+
+
+def _decode_ndjson(raw: bytes) -> List[dict]:
+    return [orjson.loads(line) for line in raw.splitlines() if line.strip()]
+
+
+def _compress(raw: bytes) -> bytes:
+    return _zstd()[0].compress(raw)
+
+
+def _decompress(data: bytes) -> bytes:
+    with _zstd()[1].stream_reader(data, read_across_frames=True) as reader:
+        return reader.readall()
+
+
+# -----------------------------------------------------------------------------
+# Thread cache
+# -----------------------------------------------------------------------------
+# thread_id -> (blob generation, messages). A warm thread is validated with a
+# metadata-only reload() and only downloaded again if its generation changed.
+THREAD_CACHE_SIZE = 1024
+THREAD_CACHE_TTL_S = 300
+
+_thread_cache: TTLCache = TTLCache(maxsize=THREAD_CACHE_SIZE, ttl=THREAD_CACHE_TTL_S)
+_thread_cache_lock = threading.Lock()  # saves run in worker threads
+_thread_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+
+def _thread_lock(thread_id: str) -> asyncio.Lock:
+    """Per-thread lock serializing concurrent turns on the same conversation."""
+    lock = _thread_locks.get(thread_id)
+    if lock is None:
+        lock = _thread_locks[thread_id] = asyncio.Lock()
+    return lock
+
+
+def _cache_thread(thread_id: str, generation: Optional[int], messages: List[dict]) -> None:
+    with _thread_cache_lock:
+        if generation is None:
+            _thread_cache.pop(thread_id, None)
+        else:
+            _thread_cache[thread_id] = (generation, list(messages))
+
+
+def _cached_thread(thread_id: str) -> Optional[tuple]:
+    with _thread_cache_lock:
+        return _thread_cache.get(thread_id)
+
+
+def _read_legacy_thread(thread_id: str) -> List[dict]:
+    try:
+        raw = _legacy_thread_blob(thread_id).download_as_bytes()
+    except NotFound:
+        return []
+    msgs = orjson.loads(raw).get("messages", []) if raw else []
+    return msgs if isinstance(msgs, list) else []
+
+
+def _migrate_legacy_thread(thread_id: str) -> List[dict]:
+    """Convert a thread saved by an earlier version into the compressed NDJSON layout."""
+    msgs = _read_legacy_thread(thread_id)
+    if not msgs:
+        return []
+    blob = _thread_blob(thread_id)
+    try:
+        # Generation 0: only create it, never replace one another writer created
+        blob.upload_from_string(
+            data=_compress(_encode_ndjson(msgs)), content_type=THREAD_CONTENT_TYPE, if_generation_match=0
+        )
+    except PreconditionFailed:
+        # Another writer got there first (a concurrent migration or first turn): use theirs
+        msgs = _decode_ndjson(_decompress(blob.download_as_bytes()))
+        _cache_thread(thread_id, blob.generation, msgs)
+        return msgs
+    _cache_thread(thread_id, blob.generation, msgs)
+    log.info("Migrated legacy thread '%s' (%d message(s)) to compressed NDJSON", thread_id, len(msgs))
+    return msgs
+
+
+def _load_thread(thread_id: str) -> List[dict]:
     try:
         blob = _thread_blob(thread_id)
-        if not blob.exists():
-            print(f"No thread file found for '{thread_id}' in gs://{BUCKET_NAME}/{THREADS_PREFIX}/")
-            return []
-        text = blob.download_as_text(encoding="utf-8")
-        if not text:
-            return []
-        data = json.loads(text)
-        msgs = data.get("messages", [])
-        if not isinstance(msgs, list):
-            msgs = []
-        print(f"Loaded thread '{thread_id}' with {len(msgs)} message(s) from GCS")
+        cached = _cached_thread(thread_id)
+        if cached is not None:
+            try:
+                blob.reload()
+            except NotFound:
+                _cache_thread(thread_id, None, [])
+                return []
+            if blob.generation == cached[0]:
+                return list(cached[1])
+        try:
+            raw = blob.download_as_bytes()
+        except NotFound:
+            msgs = _migrate_legacy_thread(thread_id)
+            if not msgs:
+                log.debug("No thread file found for '%s' in gs://%s/%s/", thread_id, BUCKET_NAME, THREADS_PREFIX)
+            return msgs
+        msgs = _decode_ndjson(_decompress(raw))
+        _cache_thread(thread_id, blob.generation, msgs)
+        log.debug("Loaded thread '%s' with %d message(s) from GCS", thread_id, len(msgs))
         return msgs
     except Exception as e:
-        print(f"Could not load thread '{thread_id}' from GCS: {e}")
+        log.warning("Could not load thread '%s' from GCS: %s", thread_id, e)
         return []
 
 
-def save_thread_to_gcs(thread_id: str, messages: List[dict]) -> None:
-    """Save a thread’s messages back to GCS (overwrite full history)."""
+def _save_thread(thread_id: str, new_messages: List[dict]) -> None:
     try:
-        payload = {"messages": messages}
+        data = _compress(_encode_ndjson(new_messages))
         blob = _thread_blob(thread_id)
-        blob.upload_from_string(
-            data=json.dumps(payload, ensure_ascii=False),
-            content_type="application/json",
-        )
-        print(f"Saved thread '{thread_id}' with {len(messages)} message(s) to GCS")
+        cached = _cached_thread(thread_id)
+        if cached is not None:
+            base_generation = cached[0]
+        else:
+            try:
+                blob.reload()
+                base_generation = blob.generation
+            except NotFound:
+                try:
+                    # Generation 0: only create it, never replace one another writer created
+                    blob.upload_from_string(data=data, content_type=THREAD_CONTENT_TYPE, if_generation_match=0)
+                    _cache_thread(thread_id, blob.generation, new_messages)
+                    log.debug("Saved thread '%s' with %d message(s) to GCS", thread_id, len(new_messages))
+                    return
+                except PreconditionFailed:
+                    blob.reload()
+                    base_generation = blob.generation
+
+        part = _thread_part_blob(thread_id)
+        part.upload_from_string(data=data, content_type=THREAD_CONTENT_TYPE)
+        try:
+            blob.content_type = THREAD_CONTENT_TYPE
+            for attempt in range(THREAD_APPEND_ATTEMPTS):
+                try:
+                    blob.compose([blob, part], if_generation_match=base_generation)
+                    break
+                except PreconditionFailed:
+                    if attempt + 1 == THREAD_APPEND_ATTEMPTS:
+                        raise
+                    # Another writer appended since we last saw the object: append after it
+                    cached = None
+                    blob.reload()
+                    base_generation = blob.generation
+        finally:
+            part.delete()
+
+        if (blob.component_count or 1) >= THREAD_COMPACT_PARTS:
+            # Rewrite as one component (and one zstd frame, which also compresses better).
+            # Both steps are pinned to the generation just composed: if another writer
+            # appends in between, skip compaction rather than overwrite their messages
+            # (a later save compacts instead).
+            generation = blob.generation
+            try:
+                raw = _decompress(blob.download_as_bytes(if_generation_match=generation))
+                blob.upload_from_string(
+                    data=_compress(raw), content_type=THREAD_CONTENT_TYPE, if_generation_match=generation
+                )
+            except PreconditionFailed:
+                cached = None
+                log.debug("Skipped compacting thread '%s': it changed meanwhile", thread_id)
+
+        if cached is not None:
+            _cache_thread(thread_id, blob.generation, cached[1] + list(new_messages))
+        else:
+            _cache_thread(thread_id, None, [])
+        log.debug("Appended %d message(s) to thread '%s' in GCS", len(new_messages), thread_id)
     except Exception as e:
-        print(f"Could not save thread '{thread_id}' to GCS: {e}")
+        log.warning("Could not save thread '%s' to GCS: %s", thread_id, e)
+
+
+# The storage client is blocking; run each load/save in a worker thread so a
+# slow GCS round trip never stalls the event loop for other requests.
+async def load_thread_from_gcs(thread_id: str) -> List[dict]:
+    """Load a thread’s messages from GCS. Return [] if not found."""
+    return await asyncio.to_thread(_load_thread, thread_id)
+
+
+async def save_thread_to_gcs(thread_id: str, new_messages: List[dict]) -> None:
+    """Append new messages to a thread in GCS (only the delta is uploaded)."""
+    if not new_messages:
+        return
+    await asyncio.to_thread(_save_thread, thread_id, new_messages)
+
+
+# -----------------------------------------------------------------------------
+# Write-behind persistence
+# -----------------------------------------------------------------------------
+# Threads are saved by a background writer so the chat response does not wait on
+# GCS. Until a queued save lands, the latest history is served from memory.
+SAVE_BATCH_MAX = 50
+SAVE_BATCH_WINDOW_S = 0.02
+
+_pending_saves: Dict[str, List[dict]] = {}
+
+
+def enqueue_thread_save(
+    queue: asyncio.Queue, thread_id: str, history: List[dict], new_messages: List[dict]
+) -> None:
+    """Schedule appending `new_messages`; `history` is served to reads until it lands."""
+    _pending_saves[thread_id] = history
+    queue.put_nowait((thread_id, history, new_messages))
+
+
+async def _flush_saves(batch: Dict[str, tuple]) -> None:
+    for thread_id, (history, new_messages) in batch.items():
+        await save_thread_to_gcs(thread_id, new_messages)
+        if _pending_saves.get(thread_id) is history:
+            del _pending_saves[thread_id]
+
+
+def _add_to_batch(batch: Dict[str, tuple], item: tuple) -> None:
+    thread_id, history, new_messages = item
+    if thread_id in batch:
+        new_messages = batch[thread_id][1] + list(new_messages)
+    batch[thread_id] = (history, list(new_messages))
+
+
+async def thread_save_worker(queue: asyncio.Queue) -> None:
+    """Drain the save queue, coalescing saves that arrive within a short window.
+
+    A `None` item flushes what is pending and stops the worker.
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        item = await queue.get()
+        if item is None:
+            return
+        batch: Dict[str, tuple] = {}
+        _add_to_batch(batch, item)
+        deadline = loop.time() + SAVE_BATCH_WINDOW_S
+        stop = False
+        while len(batch) < SAVE_BATCH_MAX:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            if item is None:
+                stop = True
+                break
+            _add_to_batch(batch, item)
+        await _flush_saves(batch)
+        if stop:
+            return
+
+
+_MSG_KEYS = frozenset(("role", "content"))
 
 
 def _normalize_msg(m: dict) -> dict:
     """Ensure a message is a plain dict with role/content."""
+    if type(m) is dict and m.keys() == _MSG_KEYS:
+        return m  # already normal; messages are never mutated in place
     if isinstance(m, dict):
         return {"role": m.get("role"), "content": m.get("content")}
     role = getattr(m, "role", None)
@@ -123,37 +445,47 @@ def _normalize_msg(m: dict) -> dict:
     return {"role": role, "content": content}
 
 
+# How many trailing history messages the slow path of the diff compares against.
+DIFF_TAIL_MESSAGES = 4
+
+
+def _content_key(m: dict) -> int:
+    """64-bit hash of (role, content); hashed from bytes to skip building a key string."""
+    content = m.get("content")
+    if isinstance(content, (dict, list)):
+        data = orjson.dumps(content)
+    else:
+        data = str(content).encode("utf-8")
+    return xxhash.xxh3_64_intdigest(str(m.get("role")).encode("utf-8") + b"\x00" + data)
+
+
 def _diff_new_assistant_messages(before: List[dict], after: List[dict]) -> List[dict]:
     """Return assistant messages that appear in 'after' but not in 'before'."""
+    if not after or after is before:
+        return []
     if len(after) > len(before):
         tail = after[len(before):]
         return [_normalize_msg(m) for m in tail if isinstance(m, dict) and m.get("role") == "assistant"]
 
-    seen = {
-        (m.get("role"), json.dumps(m.get("content"), ensure_ascii=False)
-         if isinstance(m.get("content"), (dict, list)) else str(m.get("content")))
-        for m in before
-    }
+    # New messages always come after the last thing we sent, so walk 'after'
+    # from the end and stop at the first message already in the history tail.
+    recent = {_content_key(m) for m in before[-DIFF_TAIL_MESSAGES:]}
     out = []
-    for m in after:
-        key = (m.get("role"), json.dumps(m.get("content"), ensure_ascii=False)
-               if isinstance(m.get("content"), (dict, list)) else str(m.get("content")))
-        if key not in seen and m.get("role") == "assistant":
-            out.append(_normalize_msg(m))
+    for m in reversed(after):
+        m = _normalize_msg(m)
+        if _content_key(m) in recent:
+            break
+        if m.get("role") == "assistant":
+            out.append(m)
+    out.reverse()
     return out
 
 
 # -----------------------------------------------------------------------------
 # Schemas
 # -----------------------------------------------------------------------------
-class Message(BaseModel):
-    role: str = Field(pattern=r"^(system|user|assistant)$")
-    content: str | list | dict
-
-
 class ChatRequest(BaseModel):
     message: str
-    history: List[Message] = Field(default_factory=list)
     stream: bool = False
     system_prompt: Optional[str] = None
     thread_id: Optional[str] = None
@@ -163,20 +495,49 @@ class ChatResponse(BaseModel):
     reply: str
 
 
+def _sse(payload: dict) -> bytes:
+    """Encode one Server-Sent Events `data:` frame."""
+    return b"data: " + orjson.dumps(payload) + b"\n\n"
+
+
+# -----------------------------------------------------------------------------
+# LLM context window
+# -----------------------------------------------------------------------------
+# Only the system prompt and at most the last LLM_HISTORY_TURNS user/assistant
+# turns are sent to the graph; the full history is still kept and persisted.
+# Old turns are dropped LLM_HISTORY_STEP at a time rather than one per turn, so
+# the prompt prefix stays identical (and provider-cacheable) for several turns.
+LLM_HISTORY_TURNS = int(os.getenv("LLM_HISTORY_TURNS", "8"))
+LLM_HISTORY_STEP = int(os.getenv("LLM_HISTORY_STEP", "4"))
+
+
+def _llm_window(history: List[dict]) -> List[dict]:
+    keep = 2 * LLM_HISTORY_TURNS + 1  # previous turns + the new user message
+    excess = len(history) - 1 - keep
+    if excess <= 0:
+        return history
+    step = 2 * max(1, min(LLM_HISTORY_STEP, LLM_HISTORY_TURNS))
+    drop = -(-excess // step) * step  # round up to whole steps
+    return [history[0], *history[1 + drop:]]
+
+
 # -----------------------------------------------------------------------------
 # Debug helper
 # -----------------------------------------------------------------------------
 def _print_messages(label: str, messages: List[dict]) -> None:
-    print(f"\n{label}: total {len(messages)} message(s)")
+    # Formatting the tail costs a dumps per dict message; skip it unless debugging
+    if not log.isEnabledFor(logging.DEBUG):
+        return
+    log.debug("%s: total %d message(s)", label, len(messages))
     for i, m in enumerate(messages[-6:], start=max(1, len(messages) - 5)):
         role = m.get("role", "unknown")
         content = m.get("content", "")
         if isinstance(content, list):
             content = " ".join(str(c) for c in content)
         elif isinstance(content, dict):
-            content = json.dumps(content, ensure_ascii=False)
+            content = orjson.dumps(content).decode()
         content = str(content).replace("\n", " ")
-        print(f"   {i}. ({role}) {content[:160]}{'...' if len(content) > 160 else ''}")
+        log.debug("   %d. (%s) %s%s", i, role, content[:160], "..." if len(content) > 160 else "")
 
 
 # -----------------------------------------------------------------------------
@@ -184,19 +545,38 @@ def _print_messages(label: str, messages: List[dict]) -> None:
 # -----------------------------------------------------------------------------
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    llm = OpenAIChat()
-    app.state.llm = llm
+    # Only queue records while the listener drains them
+    _log_listener.start()
+    logging.getLogger().addHandler(_log_handler)
+    # Share the graph's client and open its connection in the background, so
+    # startup isn't held up by it but the first request usually finds it ready
+    app.state.llm = graph_llm
+    warmup = asyncio.create_task(graph_llm.warmup())
+    app.state.save_queue = asyncio.Queue()
+    save_worker = asyncio.create_task(thread_save_worker(app.state.save_queue))
     yield
+    warmup.cancel()
+    # Flush queued thread saves before shutting down
+    app.state.save_queue.put_nowait(None)
+    await save_worker
+    await aclose_shared_clients()
+    logging.getLogger().removeHandler(_log_handler)
+    _log_listener.stop()  # flushes what is still queued
 
 
 # -----------------------------------------------------------------------------
 # App factory
 # -----------------------------------------------------------------------------
 def create_app() -> FastAPI:
-    app = FastAPI(title="Agent API", version="0.4.2-gcs-env", lifespan=lifespan)
+    app = FastAPI(
+        title="Agent API",
+        version="0.4.2-gcs-env",
+        lifespan=lifespan,
+        default_response_class=ORJSONResponse,
+    )
     app.add_middleware(
         CORSMiddleware,
-        allow_origins=["*"],
+        allow_origins=CORS_ALLOW_ORIGINS,
         allow_credentials=False,
         allow_methods=["GET", "POST", "OPTIONS"],
         allow_headers=["*"],
@@ -209,42 +589,100 @@ def create_app() -> FastAPI:
     @app.post("/api/chat", response_model=ChatResponse)
     async def chat(req: ChatRequest):
         thread_id = req.thread_id or "web-fixed"
+        if req.stream:
+            return StreamingResponse(_chat_stream(req, thread_id), media_type="text/event-stream")
+        async with _thread_lock(thread_id):
+            return await _chat_turn(req, thread_id)
+
+    async def _start_turn(req: ChatRequest, thread_id: str):
+        """Load the thread and append the user message. Returns (history, persisted count)."""
         system_msg = req.system_prompt or DEFAULT_SYSTEM_PROMPT
 
-        # 1) Load history
-        history: List[dict] = [_normalize_msg(m) for m in load_thread_from_gcs(thread_id)]
+        # 1) Load history (a save still in flight is newer than what GCS holds)
+        pending = _pending_saves.get(thread_id)
+        if pending is not None:
+            history: List[dict] = list(pending)
+        else:
+            history = [_normalize_msg(m) for m in await load_thread_from_gcs(thread_id)]
         if not history:
             history = [{"role": "system", "content": system_msg}]
+            persisted = 0
+        else:
+            persisted = len(history)
 
         _print_messages(f"Loaded (thread={thread_id})", history)
 
         # 2) Add user message
         history.append({"role": "user", "content": req.message})
+        return history, persisted
+
+    def _finish_turn(thread_id: str, history: List[dict], persisted: int, sent: List[dict], result: dict) -> str:
+        """Merge the graph result into history, queue the save and return the reply text."""
+        # 4) Detect new assistant messages (relative to what the graph was given).
+        #    The diff normalizes only the new tail it returns; the prefix is `sent`.
+        result_msgs: List[dict] = result.get("messages") or sent
+        new_assistant = _diff_new_assistant_messages(before=sent, after=result_msgs)
+        if new_assistant:
+            history.extend(new_assistant)
+
+        # 5) Extract reply (the newest assistant message; only scan history if none was added)
+        if new_assistant:
+            last_assistant = new_assistant[-1]
+        else:
+            last_assistant = next((m for m in reversed(history) if m.get("role") == "assistant"), None)
+        reply = last_assistant.get("content", "").strip() if last_assistant else "(no assistant response found)"
+
+        # 6) Persist thread (write-behind)
+        enqueue_thread_save(app.state.save_queue, thread_id, history, history[persisted:])
+        _print_messages(f"Saved (thread={thread_id})", history)
+        return reply
+
+    async def _chat_turn(req: ChatRequest, thread_id: str):
+        history, persisted = await _start_turn(req, thread_id)
+        sent = _llm_window(history)
 
         # 3) Run graph
         try:
             result = await graph.ainvoke(
-                {"messages": history},
+                {"messages": sent, "last_user_idx": len(sent) - 1},
                 config={"configurable": {"thread_id": thread_id}},
             )
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Graph error: {e}")
 
-        # 4) Detect new assistant messages
-        result_msgs: List[dict] = [_normalize_msg(m) for m in result.get("messages", [])]
-        new_assistant = _diff_new_assistant_messages(before=history, after=result_msgs or history)
-        if new_assistant:
-            history.extend(new_assistant)
-
-        # 5) Extract reply
-        last_assistant = next((m for m in reversed(history) if m.get("role") == "assistant"), None)
-        reply = last_assistant.get("content", "").strip() if last_assistant else "(no assistant response found)"
-
-        # 6) Persist thread
-        save_thread_to_gcs(thread_id, history)
-        _print_messages(f"Saved (thread={thread_id})", history)
-
-        return ChatResponse(reply=reply)
+        reply = _finish_turn(thread_id, history, persisted, sent, result)
+
+        # Return the response directly so FastAPI skips re-validating it against response_model
+        return ORJSONResponse(ChatResponse(reply=reply).model_dump())
+
+    async def _chat_stream(req: ChatRequest, thread_id: str):
+        """
+        Server-Sent Events for `stream: true`: {"delta": ...} per token while the
+        persona answers, then {"reply": ...} with the final labeled message (or
+        {"error": ...}). The turn is queued for saving before the final event.
+        """
+        async with _thread_lock(thread_id):
+            history, persisted = await _start_turn(req, thread_id)
+            sent = _llm_window(history)
+
+            # 3) Run graph, forwarding the token events the nodes write
+            result: dict = {}
+            try:
+                async for mode, chunk in graph.astream(
+                    {"messages": sent, "last_user_idx": len(sent) - 1},
+                    config={"configurable": {"thread_id": thread_id, "stream": True}},
+                    stream_mode=["custom", "values"],
+                ):
+                    if mode == "custom":
+                        yield _sse(chunk)
+                    else:
+                        result = chunk
+            except Exception as e:
+                yield _sse({"error": f"Graph error: {e}"})
+                return
+
+            reply = _finish_turn(thread_id, history, persisted, sent, result)
+            yield _sse(ChatResponse(reply=reply).model_dump())
 
     return app
 
@@ -1,57 +1,164 @@
-from openai import OpenAI
+from openai import AsyncOpenAI
+import asyncio
 import chromadb
-import uuid
+import functools
+import hashlib
+import numpy as np
+import weakref
 from pathlib import Path
 
+EMBEDDING_MODEL = "text-embedding-3-small"
+EMBEDDING_BATCH_SIZE = 96     # chunks per embeddings request (requests are sent concurrently)
+EMBEDDING_MAX_CONCURRENCY = 8 # embeddings requests in flight at once, across all files
+CHROMA_ADD_BATCH_SIZE = 1000  # rows per collection.add; very large inserts stall SQLite
+
 
 def simple_text_splitter(text: str, chunk_size: int = 500, chunk_overlap: int = 50):
     """Split text into overlapping chunks without LangChain."""
-    chunks = []
-    start = 0
-    while start < len(text):
-        end = min(len(text), start + chunk_size)
-        chunks.append(text[start:end])
-        start += chunk_size - chunk_overlap
-    return chunks
+    step = chunk_size - chunk_overlap
+    if step <= 0:
+        raise ValueError("chunk_overlap must be smaller than chunk_size")
+    return [text[start:start + chunk_size] for start in range(0, len(text), step)]
 
 
-def ingest_document(
+def _chunk_id(chunk: str) -> str:
+    """Deterministic Chroma ID: the same chunk text always maps to the same row."""
+    return hashlib.sha256(chunk.encode("utf-8")).hexdigest()[:32]
+
+
+def _embedding_cache_file(doc_text: str, cache_dir: str, chunk_size: int, chunk_overlap: int) -> Path:
+    """Path of the precomputed-embeddings artifact for this exact document + chunking."""
+    key = f"{EMBEDDING_MODEL}:{chunk_size}:{chunk_overlap}:".encode("utf-8") + doc_text.encode("utf-8")
+    return Path(cache_dir) / f"{hashlib.sha256(key).hexdigest()}.npz"
+
+
+@functools.lru_cache(maxsize=4)
+def _chroma_client(db_path: str):
+    return chromadb.PersistentClient(path=db_path)
+
+
+@functools.lru_cache(maxsize=16)
+def _get_collection(db_path: str, collection_name: str):
+    return _chroma_client(db_path).get_or_create_collection(name=collection_name)
+
+
+def _batched(items: list, size: int) -> list[list]:
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+# One limiter per event loop: the sync wrappers run each call in a fresh loop, and
+# an asyncio.Semaphore cannot be shared between loops.
+_embedding_limits: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def _embedding_limit() -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    sem = _embedding_limits.get(loop)
+    if sem is None:
+        sem = _embedding_limits[loop] = asyncio.Semaphore(EMBEDDING_MAX_CONCURRENCY)
+    return sem
+
+
+async def embed_chunks(chunks: list[str], client: AsyncOpenAI = None) -> list[list[float]]:
+    """
+    Embed chunks in EMBEDDING_BATCH_SIZE requests issued concurrently (at most
+    EMBEDDING_MAX_CONCURRENCY in flight, shared by all files); keeps input order.
+    """
+    if client is None:
+        # The client's connection pool belongs to this loop: close it when done
+        async with AsyncOpenAI() as own_client:
+            return await embed_chunks(chunks, client=own_client)
+    sem = _embedding_limit()
+
+    async def _embed(batch: list[str]):
+        async with sem:
+            return await client.embeddings.create(model=EMBEDDING_MODEL, input=batch)
+
+    responses = await asyncio.gather(*map(_embed, _batched(chunks, EMBEDDING_BATCH_SIZE)))
+    return [e.embedding for response in responses for e in response.data]
+
+
+async def ingest_document_async(
     doc_text: str,
     collection_name: str = "startup_mentor",
     db_path: str = "./chroma_db",
+    cache_dir: str = "./data/ingest_cache",
+    client: AsyncOpenAI = None,
 ):
     """
     Ingest a document into a persistent Chroma collection.
     - Splits text into chunks
-    - Embeds each chunk with OpenAI
-    - Stores embeddings + chunks in Chroma
+    - Skips chunks already stored (IDs are content hashes, so re-ingesting is a no-op)
+    - Embeds the remaining chunks with OpenAI (or loads cached embeddings for the same document)
+    - Upserts embeddings + chunks in Chroma
+
+    Without a `client`, one is created for the embeddings calls and closed afterwards.
     """
 
-    # Split into chunks
-    chunks = simple_text_splitter(doc_text, chunk_size=500, chunk_overlap=50)
+    # Split into chunks (identical chunks would collide on their content-hash ID)
+    chunks = list(dict.fromkeys(simple_text_splitter(doc_text, chunk_size=500, chunk_overlap=50)))
 
     if not chunks:
         print("No text to ingest.")
         return None
 
-    # Initialize clients
-    client = OpenAI()
-    chroma = chromadb.PersistentClient(path=db_path)
-    collection = chroma.get_or_create_collection(name=collection_name)
+    collection = _get_collection(db_path, collection_name)
+
+    ids = [_chunk_id(c) for c in chunks]
+    present = set()
+    for start in range(0, len(ids), CHROMA_ADD_BATCH_SIZE):
+        present.update(collection.get(ids=ids[start:start + CHROMA_ADD_BATCH_SIZE], include=[])["ids"])
+    todo = [i for i, chunk_id in enumerate(ids) if chunk_id not in present]
+    if not todo:
+        print(f"All {len(chunks)} chunks already in collection '{collection_name}'")
+        return collection
+
+    # Reuse embeddings computed for this document on a previous run
+    cache_file = _embedding_cache_file(doc_text, cache_dir, chunk_size=500, chunk_overlap=50)
+    embeddings = None
+    if cache_file.exists():
+        with np.load(cache_file) as cached:
+            # Only valid for exactly these chunks (older caches hold one row per
+            # chunk before de-duplication)
+            if cached["texts"].tolist() == chunks:
+                embeddings = cached["vectors"][todo].tolist()
+        if embeddings is not None:
+            print(f"Loaded {len(embeddings)} cached embeddings from {cache_file}")
+    if embeddings is None:
+        embeddings = await embed_chunks([chunks[i] for i in todo], client=client)
+
+        if len(todo) == len(chunks):
+            cache_file.parent.mkdir(parents=True, exist_ok=True)
+            np.savez(cache_file, vectors=np.asarray(embeddings, dtype=np.float32), texts=np.asarray(chunks))
+
+    new_chunks = [chunks[i] for i in todo]
+    new_ids = [ids[i] for i in todo]
+    for start in range(0, len(todo), CHROMA_ADD_BATCH_SIZE):
+        end = start + CHROMA_ADD_BATCH_SIZE
+        collection.upsert(documents=new_chunks[start:end], embeddings=embeddings[start:end], ids=new_ids[start:end])
+
+    print(f"Ingested {len(todo)} new chunks ({len(chunks) - len(todo)} already present) into collection '{collection_name}' at {db_path}")
+    return collection
 
-    # Create embeddings in batch
-    response = client.embeddings.create(model="text-embedding-3-small", input=chunks)
-    embeddings = [e.embedding for e in response.data]
 
-    # Store in Chroma (unique IDs)
-    ids = [str(uuid.uuid4()) for _ in chunks]
-    collection.add(documents=chunks, embeddings=embeddings, ids=ids)
+def ingest_document(
+    doc_text: str,
+    collection_name: str = "startup_mentor",
+    db_path: str = "./chroma_db",
+    cache_dir: str = "./data/ingest_cache",
+):
+    """Synchronous wrapper around `ingest_document_async`."""
+    return asyncio.run(
+        ingest_document_async(doc_text, collection_name=collection_name, db_path=db_path, cache_dir=cache_dir)
+    )
 
-    print(f"Ingested {len(chunks)} chunks into collection '{collection_name}' at {db_path}")
-    return collection
 
+INGEST_CONCURRENCY = 8  # files processed at once by ingest_from_dir
 
-def ingest_from_dir(
+
+async def ingest_from_dir_async(
     dir_path: str = "./docs",
     collection_name: str = "startup_mentor",
     db_path: str = "./chroma_db",
@@ -60,39 +167,54 @@ def ingest_from_dir(
     """
     Ingest all supported documents from a directory into ChromaDB.
     Supports `.txt` and `.mp3` (transcribes audio first).
+    Up to INGEST_CONCURRENCY files are transcribed/embedded concurrently.
     """
     if file_types is None:
         file_types = ["txt"]
 
-    client = OpenAI()
     dir_path = Path(dir_path)
 
     if not dir_path.exists():
         print(f"Directory {dir_path} does not exist.")
         return None
 
-    for file in dir_path.iterdir():
-        if not file.is_file():
-            continue
-
-        ext = file.suffix.lower().lstrip(".")
-        if ext not in file_types:
-            continue
-
-        print(f"Processing {file.name} ...")
-
-        if ext == "txt":
-            text = file.read_text(encoding="utf-8")
-            ingest_document(text, collection_name=collection_name, db_path=db_path)
-
-        elif ext == "mp3":
-            with open(file, "rb") as audio_file:
-                transcript = client.audio.transcriptions.create(
-                    model="gpt-4o-transcribe",
-                    file=audio_file,
-                )
-                text = transcript.text
-                ingest_document(text, collection_name=collection_name, db_path=db_path)
+    files = [
+        file for file in dir_path.iterdir()
+        if file.is_file() and file.suffix.lower().lstrip(".") in file_types
+    ]
+    sem = asyncio.Semaphore(INGEST_CONCURRENCY)
+
+    async def _ingest_file(file: Path):
+        async with sem:
+            print(f"Processing {file.name} ...")
+            ext = file.suffix.lower().lstrip(".")
+
+            if ext == "txt":
+                text = file.read_text(encoding="utf-8")
+                await ingest_document_async(text, collection_name=collection_name, db_path=db_path, client=client)
+
+            elif ext == "mp3":
+                with open(file, "rb") as audio_file:
+                    transcript = await client.audio.transcriptions.create(
+                        model="gpt-4o-transcribe",
+                        file=audio_file,
+                    )
+                await ingest_document_async(transcript.text, collection_name=collection_name, db_path=db_path, client=client)
                 print("mp3 Ingestion complete.")
 
+    # One client (and connection pool) for the whole run, closed at the end
+    async with AsyncOpenAI() as client:
+        await asyncio.gather(*map(_ingest_file, files))
     print("Ingestion complete.")
+
+
+def ingest_from_dir(
+    dir_path: str = "./docs",
+    collection_name: str = "startup_mentor",
+    db_path: str = "./chroma_db",
+    file_types: list[str] = None,
+):
+    """Synchronous wrapper around `ingest_from_dir_async`."""
+    return asyncio.run(
+        ingest_from_dir_async(dir_path, collection_name=collection_name, db_path=db_path, file_types=file_types)
+    )
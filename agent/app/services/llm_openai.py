@@ -1,23 +1,38 @@
 from __future__ import annotations
 
+import logging
 import os
-from typing import AsyncGenerator, Dict, List, Sequence, Union, Any
+import re
+from typing import Any, AsyncGenerator, Callable, Dict, List, Sequence, Union
 
-from openai import AsyncOpenAI
+import httpx
+from openai import NOT_GIVEN, AsyncOpenAI, DefaultAsyncHttpxClient
 
 
 OpenAIMsg = Dict[str, Any]
 MsgInput = Sequence[Union[OpenAIMsg, str]]
 
+log = logging.getLogger("agent.llm")
+
+
+def _join_parts(parts: list) -> str:
+    return "\n".join([str(c) for c in parts if c])
+
+
+# Exact-type dispatch for the common content shapes
+_CONTENT_HANDLERS: Dict[type, Callable[[Any], str]] = {
+    str: lambda content: content,
+    type(None): lambda _: "",
+    list: _join_parts,
+}
+
 
 def _coerce_content(content: Any) -> str:
     """Normalize content into a string for OpenAI API."""
-    if isinstance(content, list):
-        try:
-            return "\n".join([str(c) for c in content if c])
-        except Exception:
-            return str(content)
-    return "" if content is None else str(content)
+    handler = _CONTENT_HANDLERS.get(type(content))
+    if handler is None:
+        handler = _join_parts if isinstance(content, list) else str
+    return handler(content)
 
 
 def _to_role_and_content(m: Any) -> OpenAIMsg:
@@ -40,13 +55,61 @@ def _to_role_and_content(m: Any) -> OpenAIMsg:
     return {"role": "user", "content": _coerce_content(m)}
 
 
+_ROLES = frozenset(("system", "user", "assistant"))
+
+
 def _normalize_messages(messages: MsgInput) -> List[OpenAIMsg]:
-    norm: List[OpenAIMsg] = []
-    for m in messages:
-        msg = _to_role_and_content(m)
-        if str(msg.get("content", "")).strip():
-            norm.append(msg)
-    return norm
+    # Fast path: internally built lists are already {role, content: str} dicts
+    if type(messages) is list and all(
+        type(m) is dict and type(m.get("content")) is str and m.get("role") in _ROLES
+        for m in messages
+    ):
+        return [m for m in messages if m["content"].strip()]
+    # content is always a str after _to_role_and_content; drop blank messages
+    return [msg for m in messages if (msg := _to_role_and_content(m))["content"].strip()]
+
+
+# Labels are short uppercase words; two tokens are enough to tell them apart
+CLASSIFY_MAX_TOKENS = 2
+_NON_ALPHA_RE = re.compile(r"[^A-Z]")
+
+
+def _resolve_label(raw: str, allowed: Sequence[str]) -> str:
+    """Map a (possibly truncated) label back to the one allowed label it starts."""
+    token = _NON_ALPHA_RE.sub("", raw.upper())
+    if token in allowed:
+        return token
+    matches = [label for label in allowed if token and label.startswith(token)]
+    if len(matches) != 1:
+        raise ValueError(f"Unknown label: {raw!r}")
+    return matches[0]
+
+
+_clients: Dict[tuple, AsyncOpenAI] = {}
+
+
+def _shared_client(api_key: str, base_url: str) -> AsyncOpenAI:
+    """One pooled AsyncOpenAI client per (api_key, base_url), shared by every OpenAIChat."""
+    key = (api_key, base_url)
+    client = _clients.get(key)
+    if client is None:
+        client = _clients[key] = AsyncOpenAI(
+            api_key=api_key,
+            base_url=base_url,
+            # Keep idle connections around long enough for the warmed-up one to be reused
+            http_client=DefaultAsyncHttpxClient(
+                limits=httpx.Limits(max_connections=64, max_keepalive_connections=32, keepalive_expiry=60),
+                timeout=httpx.Timeout(60.0, connect=5.0),
+            ),
+        )
+    return client
+
+
+async def aclose_shared_clients() -> None:
+    """Close the pooled clients (app shutdown); a later call builds fresh ones."""
+    while _clients:
+        _, client = _clients.popitem()
+        await client.close()
 
 
 class OpenAIChat:
@@ -57,6 +120,7 @@ class OpenAIChat:
       - OPENAI_API_KEY (required)
       - OPENAI_BASE_URL (optional, default https://api.openai.com/v1)
       - OPENAI_MODEL (default gpt-4o-mini)
+      - OPENAI_ROUTER_MODEL (optional; model for classify(), default OPENAI_MODEL)
     """
 
     def __init__(self) -> None:
@@ -66,29 +130,92 @@ class OpenAIChat:
 
         self.base_url = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
         self.model = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
-        self.client = AsyncOpenAI(api_key=self.api_key, base_url=self.base_url)
-
-    async def complete(self, messages: MsgInput) -> str:
-        """Return a single chat completion response."""
+        self.router_model = os.getenv("OPENAI_ROUTER_MODEL") or self.model
+        # prompt_cache_key is an OpenAI extension; other compatible servers may reject it
+        self.prompt_cache_keys = self.base_url.startswith("https://api.openai.com/")
+        self._warmed_client: AsyncOpenAI | None = None
+
+    @property
+    def client(self) -> AsyncOpenAI:
+        """The shared pooled client (rebuilt if it was closed at shutdown)."""
+        return _shared_client(self.api_key, self.base_url)
+
+    def _cache_body(self, cache_key: str | None) -> Dict[str, Any] | None:
+        if cache_key is None or not self.prompt_cache_keys:
+            return None
+        return {"prompt_cache_key": cache_key}
+
+    async def warmup(self) -> None:
+        """
+        Open a pooled connection (DNS + TCP + TLS) ahead of the first chat turn.
+        Runs once per pool; later calls return immediately. A failure is logged,
+        not raised, and the next call tries again.
+        """
+        client = self.client
+        if self._warmed_client is client:
+            return
+        try:
+            await client.models.retrieve(self.model)
+        except Exception as e:
+            log.warning("LLM warmup failed: %s", e)
+            return
+        self._warmed_client = client
+
+    async def complete(
+        self,
+        messages: MsgInput,
+        cache_key: str | None = None,
+        json_mode: bool = False,
+    ) -> str:
+        """Return a single chat completion response.
+
+        `cache_key` groups requests sharing a prompt prefix (e.g. one persona's
+        system message) so OpenAI routes them to the same prompt cache.
+        `json_mode` asks for a JSON object reply (the prompt must mention JSON).
+        """
         payload = _normalize_messages(messages)
         resp = await self.client.chat.completions.create(
             model=self.model,
             messages=payload,
             temperature=0.2,
             stream=False,
+            response_format={"type": "json_object"} if json_mode else NOT_GIVEN,
+            extra_body=self._cache_body(cache_key),
         )
         return (resp.choices[0].message.content or "").strip()
 
-    async def stream(self, messages: MsgInput) -> AsyncGenerator[str, None]:
-        """Stream tokens incrementally."""
+    async def classify(self, messages: MsgInput, allowed: Sequence[str]) -> str:
+        """
+        Return one of `allowed` (uppercase labels). The reply is capped at a couple
+        of tokens and decoded greedily; a truncated label is resolved by prefix.
+        """
+        payload = _normalize_messages(messages)
+        resp = await self.client.chat.completions.create(
+            model=self.router_model,
+            messages=payload,
+            temperature=0.0,
+            max_tokens=CLASSIFY_MAX_TOKENS,
+            stream=False,
+        )
+        return _resolve_label(resp.choices[0].message.content or "", allowed)
+
+    async def stream(self, messages: MsgInput, cache_key: str | None = None) -> AsyncGenerator[str, None]:
+        """Stream tokens incrementally.
+
+        Uses the raw `stream=True` chunk iterator rather than the SDK's
+        `.stream()` helper, which rebuilds a full completion snapshot per chunk.
+        """
         payload = _normalize_messages(messages)
-        async with self.client.chat.completions.stream(
+        stream = await self.client.chat.completions.create(
             model=self.model,
             messages=payload,
             temperature=0.2,
-        ) as stream:
-            async for event in stream:
-                if event.type == "message.delta" and getattr(event.delta, "content", None):
-                    yield event.delta.content
-                elif event.type == "message.stop":
-                    break
+            stream=True,
+            extra_body=self._cache_body(cache_key),
+        )
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                yield delta
@@ -1,8 +1,15 @@
 # agent/app/services/rag.py
+import asyncio
+import functools
+import hashlib
+import threading
+import time
+from collections import OrderedDict
 from pydantic import BaseModel
-from typing import Optional, List
-import chromadb
-from openai import OpenAI
+from typing import Any, Optional, List, Tuple
+import numpy as np
+
+EMBEDDING_MODEL = "text-embedding-3-small"
 
 
 class RetrievalResult(BaseModel):
@@ -14,6 +21,303 @@ class RetrievalResult(BaseModel):
     source: Optional[str] = None
 
 
+class SemanticCache:
+    """In-memory FIFO cache of retrieval results keyed by query embeddings.
+
+    Query embeddings are L2-normalized and stored in a fixed-size ring buffer, so a
+    lookup is a single matrix-vector product (cosine similarity against every cached
+    query). A hit skips the Chroma search entirely for near-duplicate questions.
+    """
+
+    def __init__(self, maxsize: int = 512, threshold: float = 0.95) -> None:
+        self.maxsize = maxsize
+        self.threshold = threshold
+        self._matrix: Optional[np.ndarray] = None  # (maxsize, d), allocated on first add
+        self._entries: List[Tuple[int, List[RetrievalResult]]] = []  # (top_k, results)
+        self._next = 0
+        self._lock = asyncio.Lock()
+
+    @staticmethod
+    def normalize(embedding: List[float]) -> np.ndarray:
+        vec = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+
+    def lookup(self, q_vec: np.ndarray, top_k: int) -> Optional[List[RetrievalResult]]:
+        """Return cached results for the most similar query above the threshold."""
+        size = len(self._entries)
+        if not size:
+            return None
+        scores = self._matrix[:size] @ q_vec
+        best = int(scores.argmax())
+        cached_k, results = self._entries[best]
+        if scores[best] >= self.threshold and cached_k >= top_k:
+            return results[:top_k]
+        return None
+
+    async def add(self, q_vec: np.ndarray, top_k: int, results: List[RetrievalResult]) -> None:
+        """Insert a query/results pair, evicting the oldest entry once full."""
+        async with self._lock:
+            if self._matrix is None:
+                self._matrix = np.zeros((self.maxsize, q_vec.shape[0]), dtype=np.float32)
+            slot = self._next
+            self._matrix[slot] = q_vec
+            if slot < len(self._entries):
+                self._entries[slot] = (top_k, results)
+            else:
+                self._entries.append((top_k, results))
+            self._next = (slot + 1) % self.maxsize
+
+
+# Collections below this size are searched exactly in memory instead of via HNSW
+EXACT_SEARCH_MAX_ITEMS = 100_000
+
+
+class ExactIndex:
+    """Brute-force in-memory index over a (small) Chroma collection.
+
+    All vectors are held in one contiguous float32 matrix, so a search is a single
+    matrix-vector product plus a partial sort. Distances follow the collection's
+    `hnsw:space` so scores stay comparable with Chroma's own results.
+    """
+
+    def __init__(self, collection, space: str = "l2") -> None:
+        data = collection.get(include=["embeddings", "documents", "metadatas"])
+        self.size = len(data["ids"])
+        self.space = space
+        self.matrix = np.asarray(data["embeddings"], dtype=np.float32)
+        self.sq_norms = np.einsum("ij,ij->i", self.matrix, self.matrix)
+        if space == "cosine":
+            norms = np.sqrt(self.sq_norms)
+            norms[norms == 0] = 1.0
+            self.matrix = self.matrix / norms[:, None]
+        self.payloads = [
+            (result_id, document, (metadatas.get("source") if metadatas else None))
+            for result_id, document, metadatas in zip(
+                data["ids"],
+                data["documents"],
+                data.get("metadatas") or [None] * self.size,
+            )
+        ]
+
+    def search(self, query_embedding: List[float], top_k: int) -> List[RetrievalResult]:
+        q = np.asarray(query_embedding, dtype=np.float32)
+        if self.space == "cosine":
+            q_norm = np.linalg.norm(q)
+            q = q / q_norm if q_norm else q
+        dots = self.matrix @ q
+        if self.space == "l2":
+            distances = self.sq_norms - 2.0 * dots + float(q @ q)
+        else:  # "ip" and "cosine"
+            distances = 1.0 - dots
+
+        k = min(top_k, self.size)
+        idx = np.argpartition(distances, k - 1)[:k] if k < self.size else np.arange(self.size)
+        idx = idx[np.argsort(distances[idx])]
+        return [
+            RetrievalResult(
+                id=self.payloads[i][0],
+                score=float(distances[i]),
+                text=self.payloads[i][1],
+                source=self.payloads[i][2],
+            )
+            for i in idx
+        ]
+
+
+class EmbedBatcher:
+    """Coalesce concurrent embedding requests into a single `embeddings.create` call.
+
+    Texts queued within `window_s` of the first one (or until `max_batch` is reached)
+    are sent together; each caller awaits the future for its own vector.
+    """
+
+    def __init__(self, client: Any, window_s: float = 0.005, max_batch: int = 256) -> None:
+        self.client = client
+        self.window_s = window_s
+        self.max_batch = max_batch
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._timer: Optional[asyncio.Task] = None
+        self._inflight: set = set()  # keep running sends referenced until done
+
+    async def embed(self, text: str) -> List[float]:
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((text, future))
+        if len(self._pending) >= self.max_batch:
+            self._send_pending()
+        elif self._timer is None:
+            self._timer = asyncio.create_task(self._send_after_window())
+            self._timer.add_done_callback(self._timer_done)
+        return await future
+
+    async def _send_after_window(self) -> None:
+        await asyncio.sleep(self.window_s)
+        self._timer = None
+        self._send_pending()
+
+    def _timer_done(self, timer: asyncio.Task) -> None:
+        # Cancelled from outside (e.g. at shutdown) rather than by _send_pending:
+        # nothing will send the queued texts, so release their callers
+        if timer.cancelled() and self._timer is timer:
+            self._timer = None
+            batch, self._pending = self._pending, []
+            for _, future in batch:
+                future.cancel()
+
+    def _send_pending(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.create_task(self._send(batch))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+            task.add_done_callback(functools.partial(self._release, batch))
+
+    async def _send(self, batch: List[Tuple[str, asyncio.Future]]) -> None:
+        response = await self.client.embeddings.create(
+            model=EMBEDDING_MODEL,
+            input=[text for text, _ in batch],
+        )
+        if len(response.data) != len(batch):
+            raise RuntimeError(f"Embeddings response has {len(response.data)} rows for {len(batch)} inputs")
+        for (_, future), item in zip(batch, response.data):
+            if not future.done():
+                future.set_result(item.embedding)
+
+    @staticmethod
+    def _release(batch: List[Tuple[str, asyncio.Future]], task: asyncio.Task) -> None:
+        """Never leave a caller waiting: fail it if the send failed, cancel it if the send was cancelled."""
+        error = None if task.cancelled() else task.exception()
+        for _, future in batch:
+            if not future.done():
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.cancel()
+
+
+# LRU caches keyed by the normalized query: embeddings, and final results per
+# (query, top_k). Repeated phrasings skip the embed call and the search.
+EMBED_CACHE_SIZE = 2048
+RESULT_CACHE_SIZE = 1024
+
+# How often (seconds) cached results are checked against the collection: its count,
+# and for small collections its ids too, so a delete followed by an add that leaves
+# the count unchanged is still caught
+CONTENT_RECHECK_S = 5.0
+
+
+def _query_key(query: str) -> bytes:
+    return hashlib.blake2b(query.strip().lower().encode("utf-8"), digest_size=16).digest()
+
+
+def _lru_put(cache: OrderedDict, key: Any, value: Any, maxsize: int) -> None:
+    cache[key] = value
+    if len(cache) > maxsize:
+        cache.popitem(last=False)
+
+
+def _ids_digest(ids: List[str]) -> bytes:
+    h = hashlib.blake2b(digest_size=16)
+    for result_id in ids:
+        h.update(result_id.encode("utf-8") + b"\x00")
+    return h.digest()
+
+
+class _SharedCollection:
+    """Chroma handles plus the exact index and query caches for one collection.
+
+    Shared by every RAGPipeline on the same (db_path, collection_name), so building
+    a pipeline per request costs nothing once the collection has been opened.
+    """
+
+    def __init__(self, client: Any, collection: Any) -> None:
+        self.client = client
+        self.collection = collection
+        self.exact: Optional[ExactIndex] = None
+        self.sem_cache = SemanticCache()
+        self.embeddings: "OrderedDict[bytes, Tuple[float, ...]]" = OrderedDict()
+        self.results: "OrderedDict[Tuple[bytes, int], List[RetrievalResult]]" = OrderedDict()
+        # What the index and result caches were built from
+        self._count: Optional[int] = None
+        self._digest: Optional[bytes] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()  # index refreshes run in worker threads
+
+    def due(self) -> bool:
+        """Whether the cached index and results should be checked against the collection."""
+        return self._count is None or time.monotonic() - self._checked_at >= CONTENT_RECHECK_S
+
+    def refresh(self) -> bool:
+        """
+        Check the collection and rebuild the exact index (None if the collection is
+        empty or too large) if its content changed. Return whether it changed.
+        Blocking: run it in a worker thread.
+        """
+        with self._lock:
+            if not self.due():
+                return False  # another thread just checked
+            now = time.monotonic()
+            count = self.collection.count()
+            small = 0 < count < EXACT_SEARCH_MAX_ITEMS
+            changed = count != self._count
+            if not changed and small:
+                changed = _ids_digest(self.collection.get(include=[])["ids"]) != self._digest
+            self._checked_at = now
+            if changed:
+                self.exact = None
+                if small:
+                    space = (self.collection.metadata or {}).get("hnsw:space", "l2")
+                    self.exact = ExactIndex(self.collection, space=space)
+                self._digest = _ids_digest([payload[0] for payload in self.exact.payloads]) if self.exact else None
+                self._count = count
+            return changed
+
+    def invalidate(self) -> None:
+        """Rebuild the exact index on the next refresh."""
+        with self._lock:
+            self._count = None
+
+    def clear_results(self) -> None:
+        """Drop cached search results (the collection's content changed)."""
+        self.results.clear()
+        self.sem_cache = SemanticCache(self.sem_cache.maxsize, self.sem_cache.threshold)
+
+
+# (db_path, collection_name) -> _SharedCollection, shared by every pipeline in the process
+_collections: dict = {}
+_collections_lock = threading.Lock()
+
+
+def _shared_collection(db_path: str, collection_name: str) -> _SharedCollection:
+    key = (db_path, collection_name)
+    with _collections_lock:
+        shared = _collections.get(key)
+        if shared is None:
+            import chromadb
+
+            client = chromadb.PersistentClient(path=db_path)
+            shared = _collections[key] = _SharedCollection(
+                client, client.get_or_create_collection(name=collection_name)
+            )
+    return shared
+
+
+_default_batcher: Optional[EmbedBatcher] = None
+
+
+def _shared_batcher() -> EmbedBatcher:
+    """Batcher over one process-wide AsyncOpenAI, for pipelines without an embedder."""
+    global _default_batcher
+    if _default_batcher is None:
+        from openai import AsyncOpenAI
+
+        _default_batcher = EmbedBatcher(AsyncOpenAI())
+    return _default_batcher
+
+
 class RAGPipeline:
     """RAG pipeline backed by ChromaDB and OpenAI embeddings.
 
@@ -21,32 +325,87 @@ class RAGPipeline:
     - Connect to a persistent ChromaDB collection
     - Embed queries with OpenAI
     - Retrieve the most relevant text chunks for a given query
+    - Serve near-duplicate queries from an in-memory semantic cache
+    - Search small collections exactly in memory instead of through HNSW
     - Format retrieved context for LLM prompts
     """
 
-    def __init__(self, collection_name: str = "startup_mentor", db_path: str = "./chroma_db") -> None:
+    def __init__(
+        self,
+        collection_name: str = "startup_mentor",
+        db_path: str = "./chroma_db",
+        embedder: Optional[Any] = None,
+    ) -> None:
         """
         Initialize the RAG pipeline with ChromaDB persistence and OpenAI embeddings.
 
         Args:
             collection_name: Name of the Chroma collection to use.
             db_path: Path where ChromaDB will persist vectors/documents.
+            embedder: AsyncOpenAI client to embed with (e.g. the one `OpenAIChat` uses);
+                a process-wide one is used if omitted.
+        """
+        # Persistent Chroma client (saves vectors to disk), exact index and caches:
+        # opened once per process and shared with every pipeline on this collection
+        self._shared = _shared_collection(db_path, collection_name)
+        self.client, self.collection = self._shared.client, self._shared.collection
+
+        # Embeddings client; concurrent queries share one request
+        self.embedder = embedder
+        self._batcher = EmbedBatcher(embedder) if embedder is not None else _shared_batcher()
+
+    @property
+    def sem_cache(self) -> SemanticCache:
+        """Near-duplicate queries skip the vector search."""
+        return self._shared.sem_cache
+
+    async def _sync(self) -> Optional[ExactIndex]:
+        """
+        Return the exact index, or None if the collection is too large. Every
+        `CONTENT_RECHECK_S` the collection is checked; if it changed, the index is
+        rebuilt and cached results are dropped (here, on the event loop).
+        """
+        if self._shared.due() and await asyncio.to_thread(self._shared.refresh):
+            self._shared.clear_results()
+        return self._shared.exact
+
+    async def embed(self, text: str) -> np.ndarray:
+        """
+        Embed a query once so it can be reused across retrieval paths.
+
+        Args:
+            text: Query text.
+
+        Returns:
+            np.ndarray: float32 embedding vector.
         """
-        # Persistent Chroma client (saves vectors to disk)
-        self.client = chromadb.PersistentClient(path=db_path)
-        self.collection = self.client.get_or_create_collection(name=collection_name)
+        embeddings = self._shared.embeddings
+        key = _query_key(text)
+        embedding = embeddings.get(key)
+        if embedding is not None:
+            embeddings.move_to_end(key)
+        else:
+            embedding = tuple(await self._batcher.embed(text))
+            _lru_put(embeddings, key, embedding, EMBED_CACHE_SIZE)
+        return np.asarray(embedding, dtype=np.float32)
 
-        # OpenAI client for embeddings
-        self.embedder = OpenAI()
+    def clear_cache(self) -> None:
+        """
+        Drop cached embeddings and results and rebuild the exact index on next use
+        (e.g. after re-ingesting documents). Applies to every pipeline on this collection.
+        """
+        self._shared.embeddings.clear()
+        self._shared.clear_results()
+        self._shared.invalidate()
 
     async def retrieve(self, query: str, top_k: int = 4) -> List[RetrievalResult]:
         """
         Retrieve the top-k most relevant text chunks from Chroma for a given query.
 
         Steps:
+        - Return cached results if the same (normalized) query was seen before.
         - Create an embedding for the input query using OpenAI.
-        - Perform a similarity search against the Chroma collection.
-        - Return results as a list of `RetrievalResult`.
+        - Search with that embedding via `retrieve_by_vector`.
 
         Args:
             query: User input string to search against stored documents.
@@ -55,20 +414,56 @@ class RAGPipeline:
         Returns:
             List[RetrievalResult]: Each containing id, similarity score, text, and optional source.
         """
-        # Create embedding for the query
-        query_embedding = self.embedder.embeddings.create(
-            model="text-embedding-3-small",
-            input=query
-        ).data[0].embedding
+        await self._sync()
+        results = self._shared.results
+        key = (_query_key(query), top_k)
+        cached = results.get(key)
+        if cached is not None:
+            results.move_to_end(key)
+            return list(cached)  # a copy, so callers cannot mutate the cached list
+        retrieved = await self.retrieve_by_vector(await self.embed(query), top_k=top_k)
+        _lru_put(self._shared.results, key, list(retrieved), RESULT_CACHE_SIZE)
+        return retrieved
+
+    async def retrieve_by_vector(self, query_embedding: np.ndarray, top_k: int = 4) -> List[RetrievalResult]:
+        """
+        Retrieve the top-k most relevant text chunks for an already-computed query embedding.
+
+        Steps:
+        - Return cached results if a previous query is similar enough.
+        - Otherwise search the collection (exactly in memory while it is small).
+        - Return results as a list of `RetrievalResult`.
+
+        Args:
+            query_embedding: Embedding returned by `embed`.
+            top_k: Number of results to return (default = 4).
+
+        Returns:
+            List[RetrievalResult]: Each containing id, similarity score, text, and optional source.
+        """
+        exact = await self._sync()
+
+        # Semantic cache lookup (cosine similarity against recent queries)
+        q_vec = self.sem_cache.normalize(query_embedding)
+        cached = self.sem_cache.lookup(q_vec, top_k)
+        if cached is not None:
+            return cached
+
+        # Small collections: exact scan over the in-memory matrix
+        if exact is not None:
+            retrieved = exact.search(query_embedding, top_k)
+            await self.sem_cache.add(q_vec, top_k, retrieved)
+            return retrieved
 
         # Search in Chroma
-        results = self.collection.query(
-            query_embeddings=[query_embedding],
+        results = await asyncio.to_thread(
+            self.collection.query,
+            query_embeddings=[np.asarray(query_embedding, dtype=np.float32).tolist()],
             n_results=top_k
         )
 
         # Convert to RetrievalResult[]
-        return [
+        retrieved = [
             RetrievalResult(
                 id=result_id,
                 score=score,
@@ -82,6 +477,8 @@ class RAGPipeline:
                 results.get("metadatas", [[]])[0],
             )
         ]
+        await self.sem_cache.add(q_vec, top_k, retrieved)
+        return retrieved
 
     def format_context(self, results: List[RetrievalResult]) -> str:
         """
@@ -1,31 +1,99 @@
 from google.cloud import storage
+from google.cloud.storage import transfer_manager
 from pathlib import Path
+import base64
+import google_crc32c
+import json
 import os
 
+# Objects are transferred concurrently; the client releases the GIL while on the network
+GCS_TRANSFER_WORKERS = 32
+
+# Per-directory record of local files' CRC32C, keyed by name and valid while the
+# file's size and mtime are unchanged, so unchanged files are not re-hashed.
+MANIFEST_NAME = ".gcs_manifest.json"
+
+
+def _load_manifest(local_dir: Path) -> dict:
+    try:
+        return json.loads((local_dir / MANIFEST_NAME).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_manifest(local_dir: Path, manifest: dict) -> None:
+    (local_dir / MANIFEST_NAME).write_text(json.dumps(manifest), encoding="utf-8")
+
+
+def _local_crc32c(path: Path, manifest: dict) -> str:
+    """Base64 CRC32C of a local file, in the same form GCS reports `blob.crc32c`."""
+    st = path.stat()
+    entry = manifest.get(path.name)
+    if entry and entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns:
+        return entry["crc32c"]
+    checksum = google_crc32c.Checksum()
+    with path.open("rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            checksum.update(chunk)
+    crc = base64.b64encode(checksum.digest()).decode("ascii")
+    manifest[path.name] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "crc32c": crc}
+    return crc
+
+
 def download_from_gcs(bucket_name: str, remote_path: str, local_path: str):
     client = storage.Client()
     bucket = client.bucket(bucket_name)
-    Path(local_path).mkdir(parents=True, exist_ok=True)
+    local_dir = Path(local_path)
+    local_dir.mkdir(parents=True, exist_ok=True)
+    manifest = _load_manifest(local_dir)
 
     print(f"⬇Downloading {remote_path} from bucket {bucket_name}...")
+    pairs = []
     for blob in bucket.list_blobs(prefix=remote_path):
         if blob.name.endswith("/"):
             continue
-        dest = Path(local_path) / Path(blob.name).name
-        blob.download_to_filename(dest)
-    print("Download complete.")
+        dest = local_dir / Path(blob.name).name
+        if dest.exists() and blob.crc32c and _local_crc32c(dest, manifest) == blob.crc32c:
+            continue  # unchanged
+        pairs.append((blob, str(dest)))
+    transfer_manager.download_many(
+        pairs,
+        worker_type=transfer_manager.THREAD,
+        max_workers=GCS_TRANSFER_WORKERS,
+        raise_exception=True,
+    )
+    for blob, dest in pairs:
+        _local_crc32c(Path(dest), manifest)
+    _save_manifest(local_dir, manifest)
+    print(f"Download complete ({len(pairs)} changed file(s)).")
 
 
 def upload_to_gcs(bucket_name: str, local_path: str, remote_path: str):
-    """Upload local_path/* to gs://bucket_name/remote_path"""
+    """Upload local_path/* to gs://bucket_name/remote_path (files whose CRC32C changed)"""
     client = storage.Client()
     bucket = client.bucket(bucket_name)
+    local_dir = Path(local_path)
+    manifest = _load_manifest(local_dir)
+    remote_crc = {blob.name: blob.crc32c for blob in bucket.list_blobs(prefix=f"{remote_path}/")}
+
     print(f"⬆Uploading {local_path} → gs://{bucket_name}/{remote_path}/ ...")
-    for file in Path(local_path).rglob("*"):
-        if file.is_file():
-            blob = bucket.blob(f"{remote_path}/{file.name}")
-            blob.upload_from_filename(str(file))
-    print("Upload complete.")
+    pairs = []
+    for file in local_dir.rglob("*"):
+        if not file.is_file() or file.name == MANIFEST_NAME:
+            continue
+        name = f"{remote_path}/{file.name}"
+        if remote_crc.get(name) == _local_crc32c(file, manifest):
+            continue  # unchanged
+        pairs.append((str(file), bucket.blob(name)))
+    transfer_manager.upload_many(
+        pairs,
+        worker_type=transfer_manager.THREAD,
+        max_workers=GCS_TRANSFER_WORKERS,
+        raise_exception=True,
+    )
+    if local_dir.is_dir():
+        _save_manifest(local_dir, manifest)
+    print(f"Upload complete ({len(pairs)} changed file(s)).")
 
 
 def ensure_local_data():
@@ -1,12 +1,24 @@
 # state_graph.py
 
-from typing import Dict, List, Tuple
+from typing import Annotated, Deque, Dict, Final, List, Tuple
 from typing_extensions import TypedDict
 
-import json
+import asyncio
+import functools
+import hashlib
+import logging
+import operator
+import os
+import pickle
 import re
+import weakref
+from collections import OrderedDict, deque
 from pathlib import Path
 
+import orjson
+from cachetools import TTLCache
+from langchain_core.runnables import RunnableConfig
+from langgraph.config import get_stream_writer
 from langgraph.graph import StateGraph, START, END
 
 from .services.llm_openai import OpenAIChat
@@ -15,19 +27,91 @@ from .services.llm_openai import OpenAIChat
 # =========================
 # STATE
 # =========================
+# Per-persona threads ("personas") only outlive a single graph run when the caller
+# passes them in or the graph is compiled with a checkpointer. This app does
+# neither (main.py sends just the windowed messages and the graph has no
+# checkpointer), so here they always start empty: the reducer, the nodes'
+# track_history deltas and the committee's thread checks are kept for such callers
+# but change nothing per request today.
+
+# Messages kept per persona thread (the oldest fall off)
+PERSONA_HISTORY_MAX = 16
+
+
+def _merge_personas(current: dict, update: dict) -> dict:
+    """
+    Reducer: nodes return only each persona's new messages. Threads are bounded,
+    so copying the touched ones costs O(1); LangGraph may share the current value
+    between channel copies, so it is never mutated.
+    """
+    merged = dict(current)
+    for name, msgs in update.items():
+        thread = deque(current.get(name, ()), maxlen=PERSONA_HISTORY_MAX)
+        thread.extend(msgs)
+        merged[name] = thread
+    return merged
+
+
 class State(TypedDict, total=False):
-    messages: List[dict]
-    personas: Dict[str, List[dict]]   # optional; per-persona threads (committee)
+    messages: Annotated[List[dict], operator.add]  # nodes return only new messages
+    personas: Annotated[dict[str, Deque[dict]], _merge_personas]  # optional; per-persona threads
     phase: str                        # mentor | pm | cto | vc | committee
+    last_user_idx: int                # optional; index of the latest user message
 
 
 graph_builder = StateGraph(State)
 llm = OpenAIChat()
+log = logging.getLogger("agent.graph")
+
+# Upper bound on LLM requests in flight from this process (router + personas).
+# One limiter per event loop: an asyncio.Semaphore cannot be shared between loops,
+# and scripts or tests may drive the graph from several.
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+_llm_limits: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def _llm_limit() -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    sem = _llm_limits.get(loop)
+    if sem is None:
+        sem = _llm_limits[loop] = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+    return sem
+
+
+def _messages_digest(messages: List[dict]) -> bytes:
+    h = hashlib.blake2b(digest_size=16)
+    for m in messages:
+        h.update(f"{m.get('role')}\x00{m.get('content')}\x00".encode("utf-8"))
+    return h.digest()
+
+
+# Identical completions already in flight (same messages and options): later
+# callers await the first caller's task instead of sending their own request.
+_inflight: Dict[Tuple[bytes, bool], "asyncio.Task[str]"] = {}
+
+
+async def _send_complete(messages: List[dict], cache_key: str | None, json_mode: bool) -> str:
+    async with _llm_limit():
+        return await llm.complete(messages, cache_key=cache_key, json_mode=json_mode)
+
+
+async def _bounded_complete(messages: List[dict], cache_key: str | None = None, json_mode: bool = False) -> str:
+    key = (_messages_digest(messages), json_mode)
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_send_complete(messages, cache_key, json_mode))
+        _inflight[key] = task
+        task.add_done_callback(lambda _: _inflight.pop(key, None))
+    # shield: one caller giving up (e.g. client disconnect) doesn't cancel the others
+    return await asyncio.shield(task)
 
 
 # =========================
 # Prompt loading utilities
 # =========================
+@functools.lru_cache(maxsize=1)
 def _prompts_dir() -> Path:
     here = Path(__file__).resolve().parent
     for p in [here / "prompts", here.parent / "prompts", Path.cwd() / "prompts"]:
@@ -37,8 +121,7 @@ def _prompts_dir() -> Path:
 
 
 def _read_prompt_json(path: Path) -> dict:
-    with path.open("r", encoding="utf-8") as f:
-        data = json.load(f)
+    data = orjson.loads(path.read_bytes())
     if not isinstance(data, dict):
         raise ValueError("Prompt file must be a JSON object.")
     persona = str(data.get("persona", "")).strip()
@@ -69,10 +152,48 @@ def _compose_system(spec: dict) -> str:
     return "\n\n".join(p for p in parts if p).strip()
 
 
+# Composed prompts are cached next to the prompt files, keyed by their stat().
+# Bump when the built-in defaults or _compose_system change.
+_PROMPT_CACHE_VERSION = 1
+_PROMPT_CACHE_NAME = ".prompts.cache.pkl"
+
+
+def _prompt_files_sig(dirp: Path) -> tuple:
+    files = []
+    for p in sorted(dirp.glob("*.json")):
+        st = p.stat()
+        files.append((p.name, st.st_mtime_ns, st.st_size))
+    return (_PROMPT_CACHE_VERSION, tuple(files))
+
+
 def _load_role_specs() -> Dict[str, str]:
-    """Return composed system prompts for MENTOR, PM, CTO, VC with fallbacks."""
-    prompts = {}
+    """Return composed system prompts for MENTOR, PM, CTO, VC (cached across restarts)."""
     dirp = _prompts_dir()
+    cache_file = dirp / _PROMPT_CACHE_NAME
+    try:
+        sig = _prompt_files_sig(dirp)
+    except OSError:
+        return _build_role_specs(dirp)
+    try:
+        with cache_file.open("rb") as f:
+            cached_sig, prompts = pickle.load(f)
+        if cached_sig == sig:
+            return prompts
+    except Exception:
+        pass  # missing or unreadable cache: rebuild below
+
+    prompts = _build_role_specs(dirp)
+    try:
+        with cache_file.open("wb") as f:
+            pickle.dump((sig, prompts), f)
+    except OSError:
+        pass  # read-only deployments just rebuild on every start
+    return prompts
+
+
+def _build_role_specs(dirp: Path) -> Dict[str, str]:
+    """Compose system prompts for MENTOR, PM, CTO, VC from the JSON files, with fallbacks."""
+    prompts = {}
 
     defaults = {
         "MENTOR": {
@@ -133,13 +254,21 @@ def _load_role_specs() -> Dict[str, str]:
             else:
                 prompts[name] = _compose_system(defaults[name])
         except Exception as e:
-            print(f"[prompts] Using fallback for {name}: {e}")
+            log.warning("Using fallback prompt for %s: %s", name, e)
             prompts[name] = _compose_system(defaults[name])
 
     return prompts
 
 
-ROLE_SYSTEM: Dict[str, str] = _load_role_specs()
+# Persona system prompts are static text: keeping them byte-identical (and first)
+# across requests lets the provider reuse its cached prompt prefix. Per-request
+# context belongs in user messages, never in these strings.
+ROLE_SYSTEM: Final[Dict[str, str]] = _load_role_specs()
+
+# Per-persona system message, built once and shared by every request
+_SYSTEM_PREFIX: Final[Dict[str, List[dict]]] = {
+    name: [{"role": "system", "content": text}] for name, text in ROLE_SYSTEM.items()
+}
 
 
 # =========================
@@ -158,30 +287,75 @@ _ROUTER_SYSTEM = (
     "- Otherwise choose MENTOR."
 )
 
-def _last_user(messages: List[dict]) -> dict | None:
+def _last_user(messages: List[dict], idx: int | None = None) -> dict | None:
+    """Latest user message; `idx` (when the caller tracked it) skips the scan."""
+    if idx is not None and 0 <= idx < len(messages) and messages[idx].get("role") == "user":
+        return messages[idx]
     return next((m for m in reversed(messages) if m.get("role") == "user"), None)
 
+_COMMITTEE_RE = re.compile(r"\bcommittee\b|\bpanel\b|all of you|vc\W*pm\W*cto|pm\W*cto\W*vc", re.IGNORECASE)
+
+# All role detectors in one scan; when several match, the earliest role in
+# _ROLE_PRIORITY wins (CTO > PM > VC), not the leftmost match in the text.
+_ROLE_RE = re.compile(
+    r"(?P<CTO>\bcto\b|chief technology officer|@cto)"
+    r"|(?P<PM>\bpm\b|product manager|@pm)"
+    r"|(?P<VC>\bvc\b|investor|venture capital(?:ist)?|@vc)",
+    re.IGNORECASE,
+)
+_ROLE_PRIORITY = ("CTO", "PM", "VC")
+
 def _committee_trigger(text: str) -> bool:
-    t = (text or "").lower()
-    return bool(re.search(r"\bcommittee\b|\bpanel\b|all of you|vc\W*pm\W*cto|pm\W*cto\W*vc", t))
+    return _COMMITTEE_RE.search(text or "") is not None
 
 def _heuristic_label(text: str) -> str:
-    t = (text or "").lower()
-    if _committee_trigger(t): return "COMMITTEE"
-    if re.search(r"\bcto\b|chief technology officer|@cto", t): return "CTO"
-    if re.search(r"\bpm\b|product manager|@pm", t): return "PM"
-    if re.search(r"\bvc\b|investor|venture capital(ist)?|@vc", t): return "VC"
-    return "MENTOR"
-
-async def _classify(messages: List[dict]) -> str:
-    last = _last_user(messages)
+    if _committee_trigger(text): return "COMMITTEE"
+    found = {m.lastgroup for m in _ROLE_RE.finditer(text or "")}
+    return next((label for label in _ROLE_PRIORITY if label in found), "MENTOR")
+
+# A message that opens with "@mentor", "@pm", ... names its addressee explicitly
+_MENTION_RE = re.compile(r"\s*@(mentor|pm|cto|vc|committee)\b", re.IGNORECASE)
+
+def _fast_route(text: str) -> str | None:
+    m = _MENTION_RE.match(text)
+    return m.group(1).upper() if m else None
+
+# Labels already decided for a (normalized) user message, most recently used last
+ROUTER_CACHE_SIZE = 1024
+_router_cache: "OrderedDict[bytes, str]" = OrderedDict()
+
+
+def _router_key(text: str) -> bytes:
+    return hashlib.blake2b(text.strip().lower().encode("utf-8"), digest_size=16).digest()
+
+
+def _remember_label(key: bytes, label: str) -> str:
+    _router_cache[key] = label
+    if len(_router_cache) > ROUTER_CACHE_SIZE:
+        _router_cache.popitem(last=False)
+    return label
+
+
+async def _classify(messages: List[dict], last_user_idx: int | None = None) -> str:
+    last = _last_user(messages, last_user_idx)
     if not last:
         return "MENTOR"
     text = str(last.get("content", ""))
 
-    # Hard committee trigger
-    if _committee_trigger(text):
-        return "COMMITTEE"
+    label = _fast_route(text)
+    if label is not None:
+        return label
+
+    key = _router_key(text)
+    label = _router_cache.get(key)
+    if label is not None:
+        _router_cache.move_to_end(key)
+        return label
+
+    # Explicit committee/role mentions are unambiguous: no need to ask the LLM
+    label = _heuristic_label(text)
+    if label != "MENTOR":
+        return _remember_label(key, label)
 
     # Ask LLM to classify
     try:
@@ -189,23 +363,22 @@ async def _classify(messages: List[dict]) -> str:
             {"role": "system", "content": _ROUTER_SYSTEM},
             {"role": "user", "content": text},
         ]
-        raw = (await llm.complete(router_msgs) or "").strip().upper()
-        label = re.sub(r"[^A-Z]", "", raw)
-        if label not in LABELS:
-            raise ValueError(f"Unknown label: {raw!r} → {label!r}")
-        return label
+        async with _llm_limit():
+            label = await llm.classify(router_msgs, LABELS)
+        return _remember_label(key, label)
     except Exception as e:
-        print(f"[router] LLM classify failed, using heuristic: {e}")
+        log.warning("LLM classify failed, using heuristic: %s", e)
         return _heuristic_label(text)
 
 
 # =========================
 # Seeding / labeling helpers
 # =========================
-def _ensure_seed(history: List[dict], system_prompt: str) -> List[dict]:
-    """Replace any old system message with the correct persona prompt."""
-    new_history = [m for m in history if m.get("role") != "system"]
-    return [{"role": "system", "content": system_prompt}] + new_history
+def _ensure_seed(history: List[dict]) -> List[dict]:
+    """
+    Drop any old system message; callers prepend the persona's _SYSTEM_PREFIX.
+    """
+    return [m for m in history if m.get("role") != "system"]
 
 
 LABEL_PREFIX = {
@@ -215,6 +388,12 @@ LABEL_PREFIX = {
     "VC":     "**VC:** ",
 }
 
+# Matches: "mentor:", "**Mentor:**", " VC : " etc., case-insensitive
+_LABEL_RE = {
+    label: re.compile(rf"^\s*(?:\*\*\s*)?{label.lower()}\s*:\s*", re.IGNORECASE)
+    for label in LABEL_PREFIX
+}
+
 def _apply_label(label: str, reply: str) -> str:
     """
     Add a role prefix exactly once.
@@ -222,130 +401,211 @@ def _apply_label(label: str, reply: str) -> str:
     we don't add another prefix.
     """
     reply_clean = reply.strip()
-    role = label.lower()
-    # Matches: "mentor:", "**Mentor:**", " VC : " etc., case-insensitive
-    pattern = rf"^\s*(?:\*\*\s*)?{role}\s*:\s*"
-    if re.match(pattern, reply_clean, flags=re.IGNORECASE):
+    if _LABEL_RE[label].match(reply_clean):
         return reply_clean
-    return f"{LABEL_PREFIX[label]}{reply_clean}"
+    return LABEL_PREFIX[label] + reply_clean
 
 
-async def _run_persona(name: str, history: List[dict], user_msg: dict) -> Tuple[List[dict], str]:
-    system_text = ROLE_SYSTEM[name]
-    seeded = _ensure_seed(history, system_text) + [user_msg]
-    try:
-        reply_text = await llm.complete(seeded)
-        reply_text = reply_text or "(No response generated)"
-    except Exception as e:
-        reply_text = f"(Error calling LLM for {name}: {e})"
-        print(f"LLM ERROR ({name}):", e)
-    return seeded + [{"role": "assistant", "content": reply_text}], reply_text
+# Committee replies for (thread, persona, prompt) seen recently, e.g. the same
+# question sent to the committee twice. Keyed by thread so one conversation never
+# reuses another's answer (persona threads start empty here, see State, so the
+# prompt alone would be the same across threads). Errors are never cached.
+PERSONA_CACHE_SIZE = 256
+PERSONA_CACHE_TTL_S = 300
+_persona_cache: TTLCache = TTLCache(maxsize=PERSONA_CACHE_SIZE, ttl=PERSONA_CACHE_TTL_S)
+
+
+def _persona_key(thread_id: str | None, name: str, seeded: List[dict]) -> Tuple[str | None, str, bytes]:
+    return thread_id, name, _messages_digest(seeded)
+
+
+async def _run_persona(
+    name: str, history: List[dict], user_msg: dict, thread_id: str | None = None
+) -> Tuple[List[dict], str]:
+    """Ask persona `name`; returns (this turn's user + assistant messages, reply)."""
+    seeded = _SYSTEM_PREFIX[name] + _ensure_seed(history) + [user_msg]
+    key = _persona_key(thread_id, name, seeded)
+    reply_text = _persona_cache.get(key)
+    if reply_text is None:
+        try:
+            reply_text = await _bounded_complete(seeded, cache_key=_cache_key(name))
+            reply_text = reply_text or "(No response generated)"
+            _persona_cache[key] = reply_text
+        except Exception as e:
+            reply_text = f"(Error calling LLM for {name}: {e})"
+            log.exception("LLM error (%s)", name)
+    return [user_msg, {"role": "assistant", "content": reply_text}], reply_text
+
+
+def _streaming(config: RunnableConfig) -> bool:
+    return bool((config.get("configurable") or {}).get("stream"))
+
+
+def _cache_key(name: str) -> str:
+    """Prompt-cache routing key: requests for one persona share its system prefix."""
+    return f"persona-{name.lower()}"
+
+
+async def _generate(name: str, seeded: List[dict], config: RunnableConfig) -> str:
+    """
+    Complete `seeded` as persona `name`. When the caller asked for streaming
+    (configurable "stream"), tokens are also pushed to the graph's custom stream
+    as {"delta": ...} events.
+    """
+    cache_key = _cache_key(name)
+    if not _streaming(config):
+        return await _bounded_complete(seeded, cache_key=cache_key)
+    writer = get_stream_writer()
+    parts = []
+    async with _llm_limit():
+        async for delta in llm.stream(seeded, cache_key=cache_key):
+            parts.append(delta)
+            writer({"delta": delta})
+    return "".join(parts).strip()
 
 
 # =========================
 # Nodes
 # =========================
-async def router(state: State):
-    label = await _classify(state.get("messages", []))
-    phase_map = {
-        "MENTOR": "mentor",
-        "PM": "pm",
-        "CTO": "cto",
-        "VC": "vc",
-        "COMMITTEE": "committee",
-    }
-    return {"phase": phase_map.get(label, "mentor")}
+PHASE_BY_LABEL: Dict[str, str] = {
+    "MENTOR": "mentor",
+    "PM": "pm",
+    "CTO": "cto",
+    "VC": "vc",
+    "COMMITTEE": "committee",
+}
 
 
-async def mentor_node(state: State):
-    seeded = _ensure_seed(state["messages"], ROLE_SYSTEM["MENTOR"])
-    try:
-        reply = await llm.complete(seeded)
-        reply = reply or "(No response generated)"
-    except Exception as e:
-        reply = f"(Error calling LLM: {e})"
-        print("LLM ERROR (MENTOR):", e)
-    return {
-        "messages": [{"role": "assistant", "content": _apply_label("MENTOR", reply)}],
-        "phase": "mentor",
-    }
+async def route(state: State) -> str:
+    """Entry-point dispatch: pick the persona node for the latest user message."""
+    label = await _classify(state.get("messages", []), state.get("last_user_idx"))
+    return PHASE_BY_LABEL.get(label, "mentor")
 
 
-async def pm_node(state: State):
-    seeded = _ensure_seed(state["messages"], ROLE_SYSTEM["PM"])
+async def _persona_turn(name: str, state: State, config: RunnableConfig, track_history: bool) -> dict:
+    """
+    One persona answering the conversation: the state update for its node.
+    With `track_history`, the user message and reply are also appended to the
+    persona's own thread (via _merge_personas; a no-op per request here, see State).
+    """
+    seeded = _SYSTEM_PREFIX[name] + _ensure_seed(state["messages"])
     try:
-        reply = await llm.complete(seeded)
+        reply = await _generate(name, seeded, config)
         reply = reply or "(No response generated)"
     except Exception as e:
         reply = f"(Error calling LLM: {e})"
-        print("LLM ERROR (PM):", e)
-    personas = dict(state.get("personas", {}))
-    personas["PM"] = personas.get("PM", []) + seeded[-2:]  # last user + this assistant
-    return {
-        "messages": [{"role": "assistant", "content": _apply_label("PM", reply)}],
-        "personas": personas,
-        "phase": "pm",
+        log.exception("LLM error (%s)", name)
+    update = {
+        "messages": [{"role": "assistant", "content": _apply_label(name, reply)}],
+        "phase": PHASE_BY_LABEL[name],
     }
+    if track_history:
+        update["personas"] = {name: [seeded[-1], {"role": "assistant", "content": reply}]}
+    return update
 
 
-async def cto_node(state: State):
-    seeded = _ensure_seed(state["messages"], ROLE_SYSTEM["CTO"])
-    try:
-        reply = await llm.complete(seeded)
-        reply = reply or "(No response generated)"
-    except Exception as e:
-        reply = f"(Error calling LLM: {e})"
-        print("LLM ERROR (CTO):", e)
-    personas = dict(state.get("personas", {}))
-    personas["CTO"] = personas.get("CTO", []) + seeded[-2:]
-    return {
-        "messages": [{"role": "assistant", "content": _apply_label("CTO", reply)}],
-        "personas": personas,
-        "phase": "cto",
-    }
+async def mentor_node(state: State, config: RunnableConfig):
+    return await _persona_turn("MENTOR", state, config, track_history=False)
+
+
+async def pm_node(state: State, config: RunnableConfig):
+    return await _persona_turn("PM", state, config, track_history=True)
+
+
+async def cto_node(state: State, config: RunnableConfig):
+    return await _persona_turn("CTO", state, config, track_history=True)
+
+
+async def vc_node(state: State, config: RunnableConfig):
+    return await _persona_turn("VC", state, config, track_history=True)
+
 
+# COMMITTEE_BATCHED=1 asks for all three committee replies in one JSON-mode call
+# (one round trip; only the combined persona prompt and the latest user message
+# are sent) instead of one call per persona.
+COMMITTEE_BATCHED = os.getenv("COMMITTEE_BATCHED", "0") == "1"
+COMMITTEE_NAMES = ("PM", "CTO", "VC")
 
-async def vc_node(state: State):
-    seeded = _ensure_seed(state["messages"], ROLE_SYSTEM["VC"])
+
+# Persona prompts are fixed after import: build the combined system message once
+_COMMITTEE_BATCH_SYSTEM: Final[dict] = {
+    "role": "system",
+    "content": (
+        "You are a startup committee of three experts. Answer the user's latest message "
+        "once as each of them, following each expert's instructions below.\n\n"
+        + "\n\n".join(f"## {name}\n{ROLE_SYSTEM[name]}" for name in COMMITTEE_NAMES)
+        + '\n\nReply with a JSON object only: {"PM": "...", "CTO": "...", "VC": "..."}.'
+    ),
+}
+
+
+async def _committee_batched(user_msg: dict) -> List[Tuple[List[dict], str]] | None:
+    """All committee replies from one call, in COMMITTEE_NAMES order; None if unusable."""
+    seeded = [_COMMITTEE_BATCH_SYSTEM, user_msg]
     try:
-        reply = await llm.complete(seeded)
-        reply = reply or "(No response generated)"
+        raw = await _bounded_complete(seeded, cache_key="committee", json_mode=True)
+        data = orjson.loads(raw)
+        replies = [str(data[name]).strip() or "(No response generated)" for name in COMMITTEE_NAMES]
     except Exception as e:
-        reply = f"(Error calling LLM: {e})"
-        print("LLM ERROR (VC):", e)
-    personas = dict(state.get("personas", {}))
-    personas["VC"] = personas.get("VC", []) + seeded[-2:]
-    return {
-        "messages": [{"role": "assistant", "content": _apply_label("VC", reply)}],
-        "personas": personas,
-        "phase": "vc",
-    }
+        log.warning("Batched committee call failed, asking personas one by one: %s", e)
+        return None
+    return [([user_msg, {"role": "assistant", "content": r}], r) for r in replies]
 
 
-async def committee_node(state: State):
-    personas_state = dict(state.get("personas", {}))
-    last_user = _last_user(state.get("messages", []))
-    if last_user is None:
-        return await mentor_node(state)
+_COMMITTEE_HEADER = "🧑‍⚖️ **Committee Response**\n\n"
+_COMMITTEE_FOOTER = "If you want a single, consolidated recommendation, say: `make a final decision`."
+
 
+# Filled with each persona's labeled block (see _apply_label), in COMMITTEE_NAMES order
+_COMMITTEE_TMPL = _COMMITTEE_HEADER + "{PM}\n\n{CTO}\n\n{VC}\n\n" + _COMMITTEE_FOOTER
+
+
+async def committee_node(state: State, config: RunnableConfig):
+    personas_state = state.get("personas", {})
+    last_user = _last_user(state.get("messages", []), state.get("last_user_idx"))
+    if last_user is None:
+        return await mentor_node(state, config)
+
+    names = COMMITTEE_NAMES
+    thread_id = (config.get("configurable") or {}).get("thread_id")
+    # When streaming, each persona's block is sent as soon as that persona is done
+    writer = get_stream_writer() if _streaming(config) else None
+    if writer is not None:
+        writer({"delta": _COMMITTEE_HEADER})
+
+    results = None
+    # One shared prompt can't carry three different persona threads (always empty
+    # in this app, see State, so batching applies whenever it is enabled)
+    if COMMITTEE_BATCHED and not any(personas_state.get(name) for name in names):
+        results = await _committee_batched(last_user)
+        if results is not None and writer is not None:
+            for name, (_, reply) in zip(names, results):
+                writer({"delta": _apply_label(name, reply) + "\n\n"})
+    if results is None:
+        async def ask(name: str) -> Tuple[List[dict], str]:
+            result = await _run_persona(name, personas_state.get(name, []), last_user, thread_id)
+            if writer is not None:
+                writer({"delta": _apply_label(name, result[1]) + "\n\n"})
+            return result
+
+        # The three personas are independent: ask them concurrently
+        results = await asyncio.gather(*(ask(name) for name in names), return_exceptions=True)
     all_replies = {}
-    for name in ("PM", "CTO", "VC"):
-        history = personas_state.get(name, [])
-        new_hist, text = await _run_persona(name, history, last_user)
-        personas_state[name] = new_hist
-        all_replies[name] = text
-
-    combined = (
-        "🧑‍⚖️ **Committee Response**\n\n"
-        f"**PM:** {_apply_label('PM', all_replies['PM'])}\n\n"
-        f"**CTO:** {_apply_label('CTO', all_replies['CTO'])}\n\n"
-        f"**VC:** {_apply_label('VC', all_replies['VC'])}\n\n"
-        "If you want a single, consolidated recommendation, say: `make a final decision`."
+    new_turns = {}
+    for name, result in zip(names, results):
+        if isinstance(result, BaseException):
+            log.error("LLM error (%s)", name, exc_info=result)
+            all_replies[name] = f"(Error calling LLM for {name}: {result})"
+            continue
+        new_turns[name], all_replies[name] = result
+
+    combined = _COMMITTEE_TMPL.format_map(
+        {name: _apply_label(name, reply) for name, reply in all_replies.items()}
     )
 
     return {
         "messages": [{"role": "assistant", "content": combined}],
-        "personas": personas_state,
+        "personas": new_turns,
         "phase": "committee",
     }
 
@@ -353,17 +613,16 @@ async def committee_node(state: State):
 # =========================
 # Graph wiring
 # =========================
-graph_builder.add_node("router", router)
 graph_builder.add_node("mentor", mentor_node)
 graph_builder.add_node("pm", pm_node)
 graph_builder.add_node("cto", cto_node)
 graph_builder.add_node("vc", vc_node)
 graph_builder.add_node("committee", committee_node)
 
-graph_builder.add_edge(START, "router")
+# Route straight from the entry point; each node records its own phase
 graph_builder.add_conditional_edges(
-    "router",
-    lambda s: s.get("phase", "mentor"),
+    START,
+    route,
     {
         "mentor": "mentor",
         "pm": "pm",
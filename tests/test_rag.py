@@ -0,0 +1,124 @@
+"""Smoke tests for the RAG embedding batcher, caches and exact index.
+
+Run from the repository root: python -m unittest discover -s tests
+"""
+
+import asyncio
+import tempfile
+import types
+import unittest
+from unittest import mock
+
+from agent.app.services import rag
+
+
+class FakeEmbeddings:
+    """Stand-in for `AsyncOpenAI().embeddings`: one vector per input, calls recorded."""
+
+    def __init__(self, drop: int = 0, block: bool = False) -> None:
+        self.calls = []
+        self.drop = drop  # rows left out of each response
+        self.block = block  # never answer (to test cancellation)
+
+    async def create(self, model, input):
+        self.calls.append(list(input))
+        if self.block:
+            await asyncio.Event().wait()
+        await asyncio.sleep(0)
+        rows = [types.SimpleNamespace(embedding=[1.0, float(len(text)), 0.5]) for text in input]
+        return types.SimpleNamespace(data=rows[: len(rows) - self.drop])
+
+
+def _client(embeddings: FakeEmbeddings):
+    return types.SimpleNamespace(embeddings=embeddings)
+
+
+class EmbedBatcherTest(unittest.TestCase):
+    def test_concurrent_texts_share_one_request(self):
+        embeddings = FakeEmbeddings()
+        batcher = rag.EmbedBatcher(_client(embeddings))
+
+        async def run():
+            return await asyncio.gather(*(batcher.embed("q" * (i + 1)) for i in range(10)))
+
+        vectors = asyncio.run(run())
+        self.assertEqual(len(embeddings.calls), 1)
+        self.assertEqual([v[1] for v in vectors], [float(i + 1) for i in range(10)])
+
+    def test_short_response_fails_every_caller(self):
+        batcher = rag.EmbedBatcher(_client(FakeEmbeddings(drop=1)))
+
+        async def run():
+            return await asyncio.wait_for(
+                asyncio.gather(batcher.embed("a"), batcher.embed("b"), return_exceptions=True), 1
+            )
+
+        results = asyncio.run(run())
+        self.assertTrue(all(isinstance(r, RuntimeError) for r in results))
+
+    def test_cancelled_send_releases_callers(self):
+        batcher = rag.EmbedBatcher(_client(FakeEmbeddings(block=True)))
+
+        async def run():
+            waiter = asyncio.ensure_future(batcher.embed("a"))
+            while not batcher._inflight:
+                await asyncio.sleep(0.001)
+            for task in batcher._inflight:
+                task.cancel()
+            return await asyncio.wait_for(asyncio.gather(waiter, return_exceptions=True), 1)
+
+        (result,) = asyncio.run(run())
+        self.assertIsInstance(result, asyncio.CancelledError)
+
+    def test_cancelled_window_releases_callers(self):
+        batcher = rag.EmbedBatcher(_client(FakeEmbeddings()), window_s=10)
+
+        async def run():
+            waiter = asyncio.ensure_future(batcher.embed("a"))
+            await asyncio.sleep(0)
+            batcher._timer.cancel()
+            return await asyncio.wait_for(asyncio.gather(waiter, return_exceptions=True), 1)
+
+        (result,) = asyncio.run(run())
+        self.assertIsInstance(result, asyncio.CancelledError)
+
+
+class RAGPipelineTest(unittest.TestCase):
+    def setUp(self):
+        self.db_path = tempfile.mkdtemp()
+        self.embeddings = FakeEmbeddings()
+        self.pipeline = rag.RAGPipeline(db_path=self.db_path, collection_name="docs", embedder=_client(self.embeddings))
+        self.pipeline.collection.add(
+            ids=["a", "b"],
+            embeddings=[[1.0, 1.0, 0.5], [0.0, 1.0, 0.0]],
+            documents=["doc a", "doc b"],
+        )
+
+    def test_repeated_query_is_served_from_cache(self):
+        async def run():
+            first = await self.pipeline.retrieve("What is an MVP?", top_k=1)
+            second = await self.pipeline.retrieve("  what is an mvp? ", top_k=1)
+            return first, second
+
+        first, second = asyncio.run(run())
+        self.assertEqual(first, second)
+        self.assertIsNot(first, second)
+        self.assertEqual(len(self.embeddings.calls), 1)
+
+    def test_pipelines_share_index_and_caches(self):
+        other = rag.RAGPipeline(db_path=self.db_path, collection_name="docs", embedder=_client(self.embeddings))
+        asyncio.run(self.pipeline.retrieve("q", top_k=1))
+        asyncio.run(other.retrieve("q", top_k=1))
+        self.assertIs(other.sem_cache, self.pipeline.sem_cache)
+        self.assertEqual(len(self.embeddings.calls), 1)
+
+    def test_same_count_content_change_rebuilds_index(self):
+        with mock.patch.object(rag, "CONTENT_RECHECK_S", 0):
+            self.assertEqual(asyncio.run(self.pipeline.retrieve("q", top_k=1))[0].id, "a")
+            self.pipeline.collection.delete(ids=["a"])
+            self.pipeline.collection.add(ids=["z"], embeddings=[[1.0, 1.0, 0.5]], documents=["doc z"])
+            self.assertEqual(asyncio.run(self.pipeline.retrieve("q", top_k=1))[0].id, "z")
+
+
+if __name__ == "__main__":
+    unittest.main()